@@ -0,0 +1,29 @@
+from aiounittest import AsyncTestCase
+
+from benchmarks.matchmaking import ENGINES, run
+from benchmarks.ranking import run as run_ranking
+
+
+class TestBenchmarks(AsyncTestCase):
+    def test_run(self):
+        report = run(cases=[([2, 2], [4, 5])], repeat=1)
+        results = report["results"]
+        assert len(results) == 2 * len(ENGINES)
+        for result in results:
+            assert result["teams"] == [2, 2]
+            assert result["matches"] > 0
+            assert result["seconds"] > 0
+            assert result["peak_bytes"] > 0
+
+        counts = {r["engine"]: r["matches"] for r in results[: len(ENGINES)]}
+        assert counts["verses"] == counts["iter_matches"] == 3
+        assert counts["lobby.get_matches"] == counts["ranker.rank"] == 3
+
+    def test_ranking(self):
+        report = run_ranking(cases=[(12, 100)], repeat=1)
+        results = {r["backend"]: r for r in report["results"]}
+        assert set(results) == {"regression", "online"}
+        assert results["regression"]["vs_regression"]["spearman"] == 1
+        for result in results.values():
+            assert result["seconds"] > 0
+            assert -1 <= result["vs_skill"]["kendall"] <= 1
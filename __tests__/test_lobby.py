@@ -256,6 +256,37 @@ class TestLobby(AsyncTestCase):
         final = next(matches, None)
         assert final is None
 
+    async def test_constraints(self):
+        topic = "@teams([4, 4])"
+        lobby = Lobby(bot(), ctx := channel(topic=topic))
+        players = [member() for _ in range(8)]
+        for player in players:
+            await lobby.ready(player)
+
+        a, b, c, d = [str(p.display_name) for p in players[:4]]
+        lobby.c.install(
+            f"@constraints(together: [{a}, {b}], apart: [{a}, {c}],"
+            f" pinned: {{{d}: 2}})"
+        )
+        assert not lobby.c.issues
+
+        matches = lobby.get_matches()
+        assert len(matches) == 10  # 6 choose 2 minus 5 with both a, c
+        for match in matches:
+            team_of = {p.member: team for team in match for p in team}
+            assert team_of[players[0]] == team_of[players[1]]
+            assert team_of[players[0]] != team_of[players[2]]
+
+        ctx.reset_mock()
+        await lobby.show_next_shuffle()
+        embed = ctx.send.await_args.kwargs["embed"]
+        assert str(d) in embed.fields[1].value
+
+        lobby.c.install("@constraints(pinned: {x: 3})")
+        assert lobby.c.issues["@constraints"]
+        lobby.c.install("@constraints()")
+        assert len(lobby.get_matches()) == 35
+
     async def test_shuffle(self):
         topic = "@teams([4, 4])"
         lobby = Lobby(bot(), ctx := channel(topic=topic))
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import time
+from aiounittest import AsyncTestCase
+from unittest.mock import AsyncMock, patch
+
+from discord.channel import TextChannel
+from discord.ext.commands.bot import Bot
+
+from models.lobby import Lobby
+from utils.offload import WORKERS, check_cancelled, offload, shutdown
+from utils.usage_exception import UsageException
+
+
+def pid(delay: float = 0) -> int:
+    time.sleep(delay)
+    return os.getpid()
+
+
+def search(seconds: float) -> int:
+    # Stands in for a long search that checks for cancellation.
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        check_cancelled()
+        time.sleep(0.01)
+    return os.getpid()
+
+
+def lobby() -> Lobby:
+    channel = AsyncMock(spec=TextChannel)
+    channel.topic = ""
+    return Lobby(AsyncMock(spec=Bot), channel)
+
+
+@patch("utils.offload.INLINE_LIMIT", 100)
+class TestOffload(AsyncTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutdown()
+
+    async def test_small_jobs_inline(self):
+        assert await offload(pid, size=10) == os.getpid()
+
+    async def test_large_jobs_in_pool(self):
+        assert await offload(pid, size=1000) != os.getpid()
+
+    @patch("utils.offload.WORKERS", 0)
+    async def test_pool_disabled(self):
+        assert await offload(pid, size=1000) == os.getpid()
+
+    async def test_lobby_change_cancels(self):
+        subject = lobby()
+        job = asyncio.ensure_future(
+            subject.run_matchmaking(pid, 0.5, size=1000)
+        )
+        await asyncio.sleep(0.1)
+        assert len(subject.jobs) == 1
+
+        subject.clear_cache()
+        with self.assertRaises(UsageException):
+            await job
+        assert len(subject.jobs) == 0
+
+    async def test_cancel_frees_workers(self):
+        subject = lobby()
+        searches = [
+            asyncio.ensure_future(
+                subject.run_matchmaking(search, 30, size=1000)
+            )
+            for _ in range(WORKERS + 1)
+        ]
+        await asyncio.sleep(0.2)
+        subject.clear_cache()
+        await asyncio.gather(*searches, return_exceptions=True)
+
+        # The searches stop instead of holding the workers for 30s.
+        start = time.monotonic()
+        await offload(pid, size=1000)
+        assert time.monotonic() - start < 5
+
+    async def test_inline_jobs_ignore_cancel_checks(self):
+        assert await offload(search, 0.02, size=10) == os.getpid()
@@ -0,0 +1,26 @@
+from aiounittest import AsyncTestCase
+
+from utils.permutation import Permutation
+
+
+class TestPermutation(AsyncTestCase):
+    async def test_is_permutation(self):
+        for size in [0, 1, 2, 3, 35, 100, 1000]:
+            values = list(Permutation(size))
+            assert sorted(values) == list(range(size))
+
+    async def test_seeded(self):
+        first = list(Permutation(500, seed=42))
+        second = list(Permutation(500, seed=42))
+        other = list(Permutation(500, seed=43))
+        assert first == second
+        assert first != other
+
+    async def test_random_access(self):
+        permutation = Permutation(10**12, seed=7)
+        value = permutation[123456789]
+        assert 0 <= value < 10**12
+        assert permutation[123456789] == value
+
+        with self.assertRaises(IndexError):
+            permutation[10**12]
@@ -2,7 +2,10 @@ from aiounittest import AsyncTestCase
 
 from typing import List
 
-from utils.verses import Match, Verses
+from utils.verses import Match, Verses, iter_matches
+from utils.verses import count_layouts, iter_layouts, unrank_layout
+from utils.verses import from_mask, iter_masks, to_match, TemplateCache
+from utils.constraints import Constraints
 from string import ascii_letters
 
 
@@ -71,3 +74,141 @@ class TestVerses(AsyncTestCase):
         assert len(teams := list(teams)) == 2
         assert len(teams[0]) == 1
         assert len(teams[1]) == 1
+
+    async def test_iter_matches_parity(self):
+        shapes = [
+            (8, [4, 4]),
+            (5, [1, 4]),
+            (6, [2, 2, 2]),
+            (7, [2, 3, 2]),
+            (5, [1, 2]),
+            (3, [2, 2]),
+            (2, [2, 2, 2]),
+            (0, [2, 2]),
+            (5, []),
+        ]
+        for num_players, teams in shapes:
+            for even in [True, False]:
+                id = iter([a for a in ascii_letters])
+                players = [next(id) for _ in range(num_players)]
+                expected = get_matches(players, teams, even)
+                actual = list(iter_matches(players, teams, even))
+                assert len(actual) == len(set(actual))
+                assert set(actual) == set(expected)
+
+    async def test_iter_matches_lazy(self):
+        id = iter([a for a in ascii_letters])
+        players = [next(id) for _ in range(16)]
+        matches = iter_matches(players, [4, 4])
+        first = next(matches)
+        assert len(first) == 2
+        assert all(len(team) == 4 for team in first)
+
+    async def test_unrank_layout(self):
+        shapes = [(8, [4, 4]), (5, [1, 4]), (7, [2, 3, 2]), (3, [2, 2])]
+        for num_players, teams in shapes:
+            layouts = list(iter_layouts(num_players, teams))
+            assert count_layouts(num_players, teams) == len(layouts)
+            for index, layout in enumerate(layouts):
+                assert unrank_layout(index, num_players, teams) == layout
+
+    async def test_count_layouts_large(self):
+        assert count_layouts(16, [4, 4]) == 450450
+        assert count_layouts(16, [8, 8]) == 6435
+        assert count_layouts(0, [4, 4]) == 0
+
+    async def test_masks(self):
+        id = iter([a for a in ascii_letters])
+        players = [next(id) for _ in range(7)]
+        masks = list(iter_masks(len(players), [2, 3, 2]))
+        layouts = list(iter_layouts(len(players), [2, 3, 2]))
+        assert len(masks) == len(set(masks)) == len(layouts)
+        for mask, layout in zip(masks, layouts):
+            teams = from_mask(mask, players)
+            assert [len(t) for t in teams] == [2, 3, 2]
+            expected = to_match(layout, players)
+            assert frozenset(frozenset(t) for t in teams) == expected
+            assert mask[0] & mask[1] == mask[1] & mask[2] == 0
+
+    async def test_template_cache(self):
+        cache = TemplateCache(max_shapes=2, max_matches=100)
+        first = cache.get(8, [4, 4])
+        assert len(first) == 35
+        assert cache.get(8, [4, 4]) is first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        cache.get(5, [1, 4])
+        cache.get(6, [2, 2, 2])
+        assert cache.get(8, [4, 4]) is not first  # evicted
+        assert cache.misses == 4
+
+        large = cache.get(16, [4, 4])
+        assert not isinstance(large, tuple)
+        assert next(iter(large)) == next(iter_masks(16, [4, 4]))
+
+    async def test_template_cache_neighbours(self):
+        def unordered(masks):
+            return {frozenset(m) for m in masks}
+
+        for teams in [[4, 4], [1, 4], [2, 3, 2], [4]]:
+            needed = sum(teams)
+            for num_players in range(needed, needed + 3):
+                fewer = list(iter_masks(num_players, teams))
+                more = list(iter_masks(num_players + 1, teams))
+
+                cache = TemplateCache()
+                cache.get(num_players, teams)
+                grown = cache.get(num_players + 1, teams)
+                assert len(grown) == len(more)
+                assert unordered(grown) == unordered(more)
+
+                cache = TemplateCache()
+                cache.get(num_players + 1, teams)
+                shrunk = cache.get(num_players, teams)
+                assert len(shrunk) == len(fewer)
+                assert unordered(shrunk) == unordered(fewer)
+
+    async def test_constraints(self):
+        def team_of(mask, player):
+            return next(t for t, team in enumerate(mask) if team >> player & 1)
+
+        constraints = Constraints(
+            together=[[0, 1], [1, 2]], apart=[[3, 4]], pinned={5: 1}
+        )
+        masks = list(iter_masks(8, [4, 4], True, constraints))
+        assert len(masks) == len(set(masks))
+        for mask in masks:
+            assert team_of(mask, 0) == team_of(mask, 1) == team_of(mask, 2)
+            assert team_of(mask, 3) != team_of(mask, 4)
+            assert team_of(mask, 5) == 1
+
+        # Every match that follows the rules, in either team order.
+        def follows(mask):
+            party = {team_of(mask, p) for p in [0, 1, 2]}
+            return (
+                len(party) == 1
+                and team_of(mask, 3) != team_of(mask, 4)
+                and team_of(mask, 5) == 1
+            )
+
+        expected = set()
+        for mask in iter_masks(8, [4, 4]):
+            expected |= {m for m in [mask, mask[::-1]] if follows(m)}
+        assert set(masks) == expected
+
+    async def test_constraints_parity(self):
+        shapes = [(8, [4, 4]), (5, [1, 4]), (7, [2, 3, 2]), (3, [2, 2])]
+        for num_players, teams in shapes:
+            for constraints in [Constraints(), Constraints(together=[[0]])]:
+                masks = iter_masks(num_players, teams, True, constraints)
+                expected = iter_masks(num_players, teams)
+                assert set(masks) == set(expected)
+
+    async def test_constraints_sit_out(self):
+        # Rivals can both sit out, a pinned player can't.
+        constraints = Constraints(together=[[0, 1]], apart=[[0, 1]])
+        masks = list(iter_masks(4, [1, 1], True, constraints))
+        assert masks == [(4, 8)]
+
+        constraints = Constraints(pinned={0: 0, 1: 0})
+        assert not list(iter_masks(4, [1, 1], True, constraints))
@@ -0,0 +1,205 @@
+"""
+Offline benchmarks for matchmaking. Every lobby is made of synthetic
+players with random ranks, so nothing here talks to Discord or
+Google Sheets. Run from the project root:
+
+    python -m benchmarks.matchmaking --out benchmarks/results.json
+
+Each case records the wall time, the peak memory allocated by Python
+and the matches produced per second. Compare two result files to see
+how an engine change scales before deploying it.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+from random import Random
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from models.lobby import Lobby
+from models.player import Player
+from plugins.SuperCashBrosLeftForDead.ranker import rank, ranked_page
+from utils.verses import TEMPLATES, Verses, count_layouts, iter_matches
+
+# (team sizes, lobby sizes) to sweep.
+CASES: List[Tuple[List[int], List[int]]] = [
+    ([4, 4], [8, 10, 12]),
+    ([1, 4], [5, 8, 12]),
+    ([8, 8], [16, 17]),
+    ([2, 2, 2], [6, 9, 12]),
+]
+
+# Engines that take much longer than the rest are skipped above these
+# lobby sizes.
+VERSES_MAX_PLAYERS = 12
+RANK_MAX_MATCHES = 200_000
+
+
+def synthetic_players(count: int) -> List[Player]:
+    players = []
+    for id in range(1, count + 1):
+        member = SimpleNamespace(
+            id=id, display_name=f"Player {id}", mention=f"<@{id}>"
+        )
+        player = Player(member)
+        player.set_ready()
+        players.append(player)
+
+    return players
+
+
+def synthetic_ranks(players: List[Player], seed: int = 0) -> Dict[int, int]:
+    random = Random(seed)
+    return {p.member.id: random.randint(1000, 4000) for p in players}
+
+
+def synthetic_lobby(players: List[Player], teams: List[int]) -> Lobby:
+    channel = SimpleNamespace(id=0, name="bench", topic=f"@teams({teams})")
+    lobby = Lobby(None, channel)
+    lobby.players = list(players)
+    return lobby
+
+
+def run_verses(players, teams, _ranks) -> int:
+    matches = set()
+    Verses(None, [], players, teams, matches)
+    return len(matches)
+
+
+def run_iter_matches(players, teams, _ranks) -> int:
+    return sum(1 for _ in iter_matches(players, teams))
+
+
+def run_lobby_matches(players, teams, _ranks) -> int:
+    TEMPLATES.clear()  # measure a cold lobby, not the shared cache
+    return len(synthetic_lobby(players, teams).get_matches())
+
+
+def run_rank(players, teams, ranks) -> int:
+    matches = synthetic_lobby(players, teams).get_matches()
+    asyncio.run(rank(matches, ranks.get))
+    return len(matches)
+
+
+def run_ranked_page(players, teams, ranks) -> int:
+    TEMPLATES.clear()
+    page, _after = ranked_page([ranks[p.member.id] for p in players], teams)
+    return len(page)
+
+
+ENGINES: Dict[str, Callable[..., int]] = {
+    "verses": run_verses,
+    "iter_matches": run_iter_matches,
+    "lobby.get_matches": run_lobby_matches,
+    "ranker.rank": run_rank,
+    "ranker.ranked_page": run_ranked_page,
+}
+
+
+def skip(engine: str, players: int, teams: List[int]) -> bool:
+    if engine == "verses":
+        return players > VERSES_MAX_PLAYERS
+    if engine == "ranker.rank":
+        return count_layouts(players, teams) > RANK_MAX_MATCHES
+    return False
+
+
+def measure(
+    fn: Callable[..., int], *args, repeat: int
+) -> Tuple[int, float, int]:
+    """
+    Returns the result of `fn`, its best wall time over `repeat` runs
+    and its peak traced memory. Memory is measured in a separate run
+    since tracing slows everything down.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, best, peak
+
+
+def run(
+    cases: List[Tuple[List[int], List[int]]] = CASES,
+    engines: Optional[List[str]] = None,
+    repeat: int = 3,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    results = []
+    for teams, sizes in cases:
+        for size in sizes:
+            players = synthetic_players(size)
+            ranks = synthetic_ranks(players, seed)
+            for engine in engines or list(ENGINES):
+                if skip(engine, size, teams):
+                    continue
+
+                fn = ENGINES[engine]
+                count, seconds, peak = measure(
+                    fn, players, teams, ranks, repeat=repeat
+                )
+                results.append(
+                    {
+                        "engine": engine,
+                        "teams": teams,
+                        "players": size,
+                        "matches": count,
+                        "seconds": seconds,
+                        "peak_bytes": peak,
+                        "matches_per_second": (
+                            count / seconds if seconds else None
+                        ),
+                    }
+                )
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark matchmaking.")
+    parser.add_argument("--out", default="benchmarks/results.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--engine",
+        action="append",
+        choices=list(ENGINES),
+        help="Only run this engine. Can be given more than once.",
+    )
+    args = parser.parse_args(argv)
+
+    report = run(engines=args.engine, repeat=args.repeat, seed=args.seed)
+    with open(args.out, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for r in report["results"]:
+        print(
+            f"{r['engine']:>20} {str(r['teams']):>10} {r['players']:>3}p"
+            f" {r['matches']:>8} matches {r['seconds']:>9.4f}s"
+            f" {r['peak_bytes'] / 1024:>10.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
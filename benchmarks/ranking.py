@@ -0,0 +1,144 @@
+"""
+Compares the rank backends in `ranking_config.RANK_BACKEND` on
+synthetic game histories. Every player gets a hidden skill and games
+are scored from the skills of each team plus noise, so each backend can
+be checked against the truth as well as against the regression. Run
+from the project root:
+
+    python -m benchmarks.ranking --out benchmarks/ranking.json
+
+Orderings are compared with Spearman and Kendall rank correlations
+(1.0 is the same order). Times are for a cold fit and for catching up
+after one more game.
+"""
+
+import argparse
+import json
+import platform
+import time
+from datetime import datetime, timedelta
+from random import Random
+from typing import Any, Dict, List, Optional, Tuple
+
+from scipy.stats import kendalltau, spearmanr
+
+from plugins.SuperCashBrosLeftForDead.game_data import Game, Team
+from plugins.SuperCashBrosLeftForDead.ranker import BACKENDS, RANKS, get_ranks
+from plugins.SuperCashBrosLeftForDead.season import Season
+
+from .matchmaking import measure
+
+# (players, games) in each synthetic history.
+CASES: List[Tuple[int, int]] = [(16, 200), (40, 1000), (200, 3000)]
+
+
+def synthetic_history(
+    num_players: int, num_games: int, days: int = 365, seed: int = 0
+) -> Tuple[List[Game], Dict[int, float]]:
+    """Four versus four games, oldest first, and each player's skill."""
+    random = Random(seed)
+    skills = {p: random.gauss(0, 1) for p in range(num_players)}
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    games = []
+    for i in range(num_games):
+        ids = random.sample(range(num_players), 8)
+        gap = sum(skills[p] for p in ids[:4]) - sum(skills[p] for p in ids[4:])
+        share = min(0.95, max(0.05, 0.5 + 0.05 * gap + random.gauss(0, 0.1)))
+        points = random.randint(1000, 3000)
+        date = today - timedelta(days=days * (num_games - i) // num_games)
+        one = Team(ids[:4], round(points * share))
+        two = Team(ids[4:], points - one.score)
+        games.append(Game(date, one, two))
+
+    return games, skills
+
+
+def fit(backend: str, games: List[Game], season: Season) -> Dict[int, float]:
+    RANKS.clear()
+    return get_ranks(games, season, backend)
+
+
+def catch_up(
+    backend: str, games: List[Game], season: Season, repeat: int
+) -> float:
+    """The best time to update ranks after one more game is played."""
+    best = float("inf")
+    for _ in range(repeat):
+        fit(backend, games[:-1], season)
+        start = time.perf_counter()
+        get_ranks(games, season, backend)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def agreement(a: Dict[Any, float], b: Dict[Any, float]) -> Dict[str, float]:
+    players = sorted(a.keys() & b.keys())
+    x = [a[p] for p in players]
+    y = [b[p] for p in players]
+    return {
+        "spearman": float(spearmanr(x, y)[0]),
+        "kendall": float(kendalltau(x, y)[0]),
+    }
+
+
+def run(
+    cases: List[Tuple[int, int]] = CASES,
+    repeat: int = 3,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    season = Season.all_time()
+    results = []
+    for num_players, num_games in cases:
+        games, skills = synthetic_history(num_players, num_games, seed=seed)
+        reference = fit("regression", games, season)
+        for backend in BACKENDS:
+            ranks, seconds, peak = measure(
+                fit, backend, games, season, repeat=repeat
+            )
+            update_seconds = catch_up(backend, games, season, repeat)
+            results.append(
+                {
+                    "backend": backend,
+                    "players": num_players,
+                    "games": num_games,
+                    "seconds": seconds,
+                    "catch_up_seconds": update_seconds,
+                    "peak_bytes": peak,
+                    "vs_regression": agreement(ranks, reference),
+                    "vs_skill": agreement(ranks, skills),
+                }
+            )
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare rank backends.")
+    parser.add_argument("--out", default="benchmarks/ranking.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run(repeat=args.repeat, seed=args.seed)
+    with open(args.out, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for r in report["results"]:
+        print(
+            f"{r['backend']:>10} {r['players']:>4}p {r['games']:>5}g"
+            f" {r['seconds']:>8.4f}s fit {r['catch_up_seconds']:>8.4f}s +1"
+            f" rho {r['vs_regression']['spearman']:.3f} vs regression"
+            f" {r['vs_skill']['spearman']:.3f} vs skill"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@ from discord.ext.commands.context import Context
 from discord.ext import commands
 from discord import Intents
 from utils.handle import handle
+from utils import offload
 
 
 intents = Intents.default()
@@ -64,6 +65,7 @@ class LFD2Bot(commands.Bot):
 
     async def close(self):
         """Lifecycle Event: Bot will shut down soon."""
+        offload.shutdown()
         await super().close()
 
     def load_cogs(self):
@@ -113,6 +113,7 @@ class LobbyCommands(Cog):
             # Discord.py parsing breaks on spaces. We want everything.
             update = ctx.message.content.strip("?config ")
             lobby.c.install(update)
+            lobby.clear_cache()
 
         await lobby.show_config()
 
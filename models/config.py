@@ -3,7 +3,7 @@ from utils.directive import directive
 import utils.directive as directives
 import inspect
 
-from typing import Callable, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from discord import TextChannel, Embed, Colour
 from discord.ext.commands import Bot
@@ -26,6 +26,9 @@ class Config:
         self.vBroadcastChannels: List = list()
         self.vLaunch: Optional[str] = None
         self.vIcon: Optional[str] = None
+        self.vTogether: List[List[str]] = []
+        self.vApart: List[List[str]] = []
+        self.vPinned: Dict[str, int] = {}
 
         self.issues = {}
 
@@ -142,6 +145,44 @@ class Config:
             self.asSteamGame(steamID)
             return
 
+    @directive
+    def constraints(self, props: str):
+        props = directives.parse_multi(props)
+        if type(props) is not dict:
+            self.issue("You must provide a value. Ex: `together: [A, B]`")
+            return
+
+        unknown = set(props) - {"together", "apart", "pinned"}
+        if unknown:
+            self.issue("Only `together`, `apart` and `pinned` can be set.")
+            return
+
+        together = self.__parse_groups(props.get("together"))
+        if together is None:
+            self.issue("`together` must list names. Ex: `[[A, B], [C, D]]`")
+            return
+
+        apart = self.__parse_groups(props.get("apart"))
+        if apart is None:
+            self.issue("`apart` must list names. Ex: `[[A, B], [C, D]]`")
+            return
+
+        pinned = props.get("pinned") or {}
+        if type(pinned) is not dict or any(
+            type(team) is not int or team < 1 for team in pinned.values()
+        ):
+            self.issue("`pinned` must map names to a team. Ex: `{A: 1}`")
+            return
+
+        if self.vTeams is not None:
+            if any(team > len(self.vTeams) for team in pinned.values()):
+                self.issue("Players can only be pinned to existing teams.")
+                return
+
+        self.vTogether = together
+        self.vApart = apart
+        self.vPinned = {str(name): team for name, team in pinned.items()}
+
     # -- Helpers --------------------------------------------------------------
 
     def issue(self, message: str, *, skip_frames: int = 1, area: str = None):
@@ -163,6 +204,11 @@ class Config:
             f"@overflow(`{self.vOverflow}`)\n"
             f"@broadcast(`{self.vBroadcastChannels}`)\n"
         )
+        if self.vTogether or self.vApart or self.vPinned:
+            settings = settings + (
+                f"@constraints(together: `{self.vTogether}`,"
+                f" apart: `{self.vApart}`, pinned: `{self.vPinned}`)\n"
+            )
         embed.add_field(name="Settings", value=settings, inline=False)
 
         if self.issues:
@@ -180,6 +226,22 @@ class Config:
         embed.set_footer(text=footer)
         return embed
 
+    def __parse_groups(self, groups: Any) -> Optional[List[List[str]]]:
+        """
+        Accepts one group of names, e.g. `[A, B]`, or a list of
+        groups, e.g. `[[A, B], [C, D]]`.
+        """
+        if groups is None:
+            return []
+        if type(groups) is not list:
+            return None
+        if all(type(g) is not list for g in groups):
+            groups = [groups]
+        if any(type(g) is not list for g in groups):
+            return None
+
+        return [[str(name) for name in group] for group in groups]
+
     def asSteamGame(self, steamID):
         fn = f"steam{steamID}"
         module = __import__("data.games", globals(), locals(), [fn])
@@ -1,9 +1,9 @@
 from functools import reduce
 import asyncio
 from asyncio.locks import Lock
-from random import shuffle
 
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, Iterator, List, Dict, Optional, Set
+from typing import Tuple
 
 from discord import Message, Embed, Colour
 from discord import Member, TextChannel
@@ -12,9 +12,14 @@ from discord.ext.commands.core import Command
 
 from models.config import Config
 from models.player import Player
+from utils.constraints import Constraints
 from utils.handle import handle
+from utils.offload import offload
 from utils.usage_exception import UsageException
-from utils.verses import Verses
+from utils.permutation import Permutation
+from utils.verses import Match, MatchMask, from_mask, get_template
+from utils.verses import iter_masks
+from utils.verses import count_layouts, unrank_layout
 
 
 class Lobby:
@@ -27,7 +32,9 @@ class Lobby:
         self.leavers: List[Player] = []
         self.temp_messages: dict[str, List[Message]] = {}
         self.locks: Dict[str, Lock] = {}
+        self.jobs: Set[asyncio.Future] = set()
         self._cache = {}
+        self._roster_version = 0
 
     # -- Plugins --------------------------------------------------------------
 
@@ -148,8 +155,7 @@ class Lobby:
             raise UsageException.not_enough_for_match(self.channel)
 
         if "shuffles" not in self._cache:
-            matches = self.get_matches()
-            shuffle(matches)
+            matches = self.iter_shuffled_matches()
             self._cache["shuffles"] = iter(enumerate(matches))
 
         next_match = next(self._cache["shuffles"], None)
@@ -254,14 +260,104 @@ class Lobby:
 
         return self.ready_count() >= self.c.vMin
 
-    def get_matches(self) -> List:
+    def get_constraints(self, players: List[Player]) -> Constraints:
+        """
+        Resolves the configured constraints to positions in `players`.
+        Players are matched by name or mention, and anyone who isn't
+        one of `players` is ignored.
+        """
+        index: Dict[str, int] = {}
+        for i, player in enumerate(players):
+            index[str(player.get_name()).lower()] = i
+            index[str(player.get_mention()).lower()] = i
+
+        def find(names: List[str]) -> List[int]:
+            found = (index.get(name.lower()) for name in names)
+            return [i for i in found if i is not None]
+
+        pinned = {}
+        for name, team in self.c.vPinned.items():
+            if (i := index.get(name.lower())) is not None:
+                pinned[i] = team - 1
+
+        return Constraints(
+            together=[find(group) for group in self.c.vTogether],
+            apart=[find(group) for group in self.c.vApart],
+            pinned=pinned,
+        )
+
+    def iter_match_masks(self) -> Iterator[MatchMask]:
+        """
+        Every match that follows the lobby's constraints. Bits refer
+        to the position of each player in `get_players()[0]`.
+        """
+        players, _alternates = self.get_players()
+        constraints = self.get_constraints(players)
+        teams = self.c.vTeams
+        if constraints:
+            yield from iter_masks(len(players), teams, True, constraints)
+        else:
+            yield from get_template(len(players), teams)
+
+    def iter_matches(self) -> Iterator[Match]:
         players, _alternates = self.get_players()
-        matches = set()
-        Verses(None, tuple(), players, self.c.vTeams, matches)
-        return list(matches)
+        for mask in self.iter_match_masks():
+            teams = from_mask(mask, players)
+            yield frozenset(frozenset(team) for team in teams if team)
+
+    def get_matches(self) -> List[Match]:
+        return list(self.iter_matches())
+
+    def get_match_masks(self) -> List[MatchMask]:
+        """
+        The compact version of `get_matches`. Bits refer to the
+        position of each player in `get_players()[0]`.
+        """
+        return list(self.iter_match_masks())
+
+    def iter_shuffled_matches(self) -> Iterator[List[List[Player]]]:
+        """
+        Yields every match in a random order without building the
+        full list. Each match has an index and we walk a seeded
+        permutation of those indexes, building matches on demand.
+        Teams keep the order of the configured team sizes.
+
+        Constraints have no shortcut to the n-th match, so those
+        matches are listed first and then shuffled the same way.
+        """
+        players, _alternates = self.get_players()
+        teams = self.c.vTeams
+        if self.get_constraints(players):
+            masks = self.get_match_masks()
+            for index in Permutation(len(masks)):
+                match = from_mask(masks[index], players)
+                yield [team for team in match if team]
+            return
+
+        total = count_layouts(len(players), teams)
+        for index in Permutation(total):
+            layout = unrank_layout(index, len(players), teams)
+            yield [[players[i] for i in team] for team in layout if team]
+
+    async def run_matchmaking(self, fn: Callable, *args, size: int) -> Any:
+        """
+        Runs a matchmaking job off the event loop (see `offload`). If
+        the ready players change before it finishes, the job is
+        cancelled since its result would describe the wrong lobby.
+        """
+        version = self._roster_version
+        try:
+            return await offload(fn, *args, size=size, jobs=self.jobs)
+        except asyncio.CancelledError:
+            if version == self._roster_version:
+                raise
+            raise UsageException.lobby_changed(self.channel) from None
 
     def clear_cache(self) -> None:
         self._cache = {}
+        self._roster_version += 1
+        for job in self.jobs:
+            job.cancel()
 
     async def broadcast_game_almost_full(self) -> None:
         destinations = self.c.vBroadcastChannels
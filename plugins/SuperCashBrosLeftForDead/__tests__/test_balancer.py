@@ -0,0 +1,78 @@
+from aiounittest import AsyncTestCase
+from random import randint, seed
+from unittest.mock import patch
+
+from plugins.SuperCashBrosLeftForDead.balancer import (
+    differencing,
+    greedy,
+    heuristic_matches,
+    local_search,
+)
+from plugins.SuperCashBrosLeftForDead.ranker import ranked_page, score_masks
+from plugins.SuperCashBrosLeftForDead.solver import best_matches
+from utils.verses import fill_team_sizes, mask_indexes
+
+
+def team_sizes(mask):
+    return [len(mask_indexes(team)) for team in mask]
+
+
+class TestBalancer(AsyncTestCase):
+    async def test_valid_matches(self):
+        seed(0)
+        shapes = [(12, [2, 2, 2]), (9, [1, 4]), (20, [5, 5, 5, 5])]
+        for num_players, teams in shapes:
+            ranks = [randint(1000, 4000) for _ in range(num_players)]
+            sizes = fill_team_sizes(num_players, teams)
+            for guess in [differencing, greedy]:
+                mask = guess(ranks, sizes)
+                assert team_sizes(mask) == sizes
+                players = [p for team in mask for p in mask_indexes(team)]
+                assert len(set(players)) == len(players) == sum(sizes)
+
+            page = heuristic_matches(ranks, teams, 10)
+            assert len(page) == 10
+            assert len({frozenset(mask) for _, mask in page}) == 10
+            scores = score_masks([mask for _, mask in page], ranks)
+            for (cursor, mask), score in zip(page, scores):
+                assert team_sizes(mask) == sizes
+                assert abs(cursor[0] - score) < 1e-9
+
+    async def test_local_search(self):
+        seed(1)
+        ranks = [randint(1000, 4000) for _ in range(16)]
+        sizes = [4, 4, 4, 4]
+        start = tuple(0xF << (4 * t) for t in range(4))  # sorted by id
+        better = local_search(ranks, sizes, start)
+        assert team_sizes(better) == sizes
+        before, after = score_masks([start, better], ranks)
+        assert after < before
+
+    async def test_close_to_exact(self):
+        seed(2)
+        for teams in [[4, 4, 4], [1, 4], [3, 3, 3, 3]]:
+            ranks = [randint(1000, 4000) for _ in range(12)]
+            exact = best_matches(ranks, teams, 1)[0][0][0]
+            found = heuristic_matches(ranks, teams, 1)[0][0][0]
+            assert found - exact < 50  # ranks span 3000 points
+
+    async def test_pages(self):
+        seed(3)
+        ranks = [randint(1000, 4000) for _ in range(24)]
+        both = heuristic_matches(ranks, [6, 6, 6, 6], 20)
+        first = heuristic_matches(ranks, [6, 6, 6, 6], 10)
+        second = heuristic_matches(ranks, [6, 6, 6, 6], 10, first[-1][0])
+        assert first + second == both
+
+    @patch(
+        "plugins.SuperCashBrosLeftForDead.ranking_config.RANKED_PAGE_SIZE", 5
+    )
+    async def test_ranked_page(self):
+        seed(4)
+        ranks = [randint(1000, 4000) for _ in range(24)]
+        page, after = ranked_page(ranks, [8, 8, 8])
+        assert len(page) == 5
+        assert after is not None
+        assert all(team_sizes(mask) == [8, 8, 8] for mask in page)
+        expected = heuristic_matches(ranks, [8, 8, 8], 5)
+        assert page == [mask for _, mask in expected]
@@ -0,0 +1,136 @@
+import asyncio
+import time
+from aiounittest import AsyncTestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from discord.channel import TextChannel
+
+from plugins.SuperCashBrosLeftForDead.game_data import (
+    HISTORIES,
+    GameData,
+    _clients,
+)
+from utils.usage_exception import UsageException
+
+import plugins.SuperCashBrosLeftForDead.ranking_config as rc
+
+ROWS = [
+    ["Team 1", "Score 1", "Team 2", "Score 2", "Date"],
+    ["[1, 2]", 100, "[3, 4]", 90, "01/02/2021"],
+    ["[1, 3]", 80, "[2, 4]", 95, "01/03/2021"],
+]
+
+
+def slow_download(id: str, known):
+    time.sleep(0.3)
+    return "1", ROWS
+
+
+class TestGameData(AsyncTestCase):
+    def setUp(self):
+        HISTORIES.clear()
+
+    @patch.object(GameData, "_download", slow_download)
+    async def test_fetch_does_not_block(self):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        games = await GameData.fetch("id", AsyncMock(spec=TextChannel))
+        ticker.cancel()
+        assert ticks > 10
+        assert len(games) == 2
+        assert games[0].team_one.players == [1, 2]
+
+    @patch.object(GameData, "_download", slow_download)
+    @patch.object(rc, "SHEETS_TIMEOUT_SECONDS", 0.05)
+    async def test_fetch_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(UsageException):
+            await GameData.fetch("id", AsyncMock(spec=TextChannel))
+        assert time.monotonic() - start < 0.25
+
+    async def test_cache(self):
+        revision = "1"
+        downloads = []
+
+        def download(id: str, known):
+            downloads.append(known)
+            if known == revision:
+                return revision, None
+            return revision, ROWS
+
+        hits, revalidated = HISTORIES.hits, HISTORIES.revalidated
+        misses = HISTORIES.misses
+        fetch = GameData.fetch
+        with patch.object(GameData, "_download", download):
+            channel = AsyncMock(spec=TextChannel)
+            first = await fetch("id", channel)
+            assert await fetch("id", channel) is first
+            assert downloads == [None]
+            assert HISTORIES.hits == hits + 1
+
+            # Expired, but the sheet didn't change.
+            with patch.object(rc, "SHEETS_CACHE_SECONDS", 0):
+                assert await fetch("id", channel) is first
+                assert downloads == [None, "1"]
+                assert HISTORIES.revalidated == revalidated + 1
+
+                revision = "2"
+                second = await fetch("id", channel)
+                assert second is not first and len(second) == 2
+                assert downloads == [None, "1", "1"]
+                assert HISTORIES.misses == misses + 2
+
+    async def test_concurrent_fetches_share_a_load(self):
+        downloads = []
+
+        def download(id: str, known):
+            downloads.append(id)
+            time.sleep(0.1)
+            if id == "broken":
+                raise ValueError("no such sheet")
+            return "1", ROWS
+
+        with patch.object(GameData, "_download", download):
+            channels = [AsyncMock(spec=TextChannel) for _ in range(4)]
+            fetches = [GameData.fetch("id", c) for c in channels]
+            histories = await asyncio.gather(*fetches)
+            assert downloads == ["id"]
+            assert all(h is histories[0] for h in histories)
+
+            fetches = [GameData.fetch("broken", c) for c in channels]
+            errors = await asyncio.gather(*fetches, return_exceptions=True)
+            assert downloads == ["id", "broken"]
+            for error, channel in zip(errors, channels):
+                assert isinstance(error, UsageException)
+                assert error.ctx is channel
+
+            # Failures aren't remembered, the next fetch tries again.
+            with self.assertRaises(UsageException):
+                await GameData.fetch("broken", channels[0])
+            assert downloads == ["id", "broken", "broken"]
+
+    async def test_client_is_reused(self):
+        client = MagicMock()
+        client._drive.files().get().execute.return_value = {"version": "1"}
+        client.get()._sheets[0]._values = ROWS
+        _clients.sheets = None
+        with patch("gsheets.Sheets.from_files", return_value=client) as make:
+            assert GameData._download("id", None) == ("1", ROWS)
+            assert GameData._download("id", "1") == ("1", None)
+            assert make.call_count == 1
+
+            # A failed download starts over with a new client.
+            client.get.side_effect = OSError
+            with self.assertRaises(OSError):
+                GameData._download("id", None)
+            client.get.side_effect = None
+            assert GameData._download("id", None) == ("1", ROWS)
+            assert make.call_count == 2
+        _clients.sheets = None
@@ -0,0 +1,55 @@
+from aiounittest import AsyncTestCase
+from unittest.mock import patch
+
+from benchmarks.ranking import agreement, synthetic_history
+from plugins.SuperCashBrosLeftForDead.online_model import OnlineRatings
+from plugins.SuperCashBrosLeftForDead.rank_model import game_key
+from plugins.SuperCashBrosLeftForDead.ranker import RANKS, get_ranks
+from plugins.SuperCashBrosLeftForDead.season import Season
+
+
+def keys(games):
+    return [game_key(g) for g in games]
+
+
+class TestOnlineRatings(AsyncTestCase):
+    async def test_catch_up_matches_replay(self):
+        games, _ = synthetic_history(20, 300)
+        online = OnlineRatings()
+        online.update(keys(games[:250]))
+        online.update(keys(games))
+
+        replay = OnlineRatings()
+        replay.update(keys(games))
+        players = replay.players(0)
+        assert sorted(online.players(0)) == sorted(players)
+        assert list(online.solve(players)) == list(replay.solve(players))
+
+        # Dropping the oldest games replays what's left.
+        online.update(keys(games[50:]))
+        replay = OnlineRatings()
+        replay.update(keys(games[50:]))
+        assert list(online.solve(players)) == list(replay.solve(players))
+
+    async def test_follows_skill(self):
+        games, skills = synthetic_history(20, 600)
+        online = OnlineRatings()
+        online.update(keys(games))
+        players = online.players(0)
+        ratings = dict(zip(players, online.solve(players)))
+        assert agreement(ratings, skills)["spearman"] > 0.8
+
+    async def test_backend(self):
+        games, _ = synthetic_history(20, 300)
+        RANKS.clear()
+        regression = get_ranks(games, Season.all_time())
+        online = get_ranks(games, Season.all_time(), "online")
+        assert online.keys() == regression.keys()
+        assert online != regression
+        assert agreement(online, regression)["spearman"] > 0.8
+
+        with patch(
+            "plugins.SuperCashBrosLeftForDead.ranking_config.RANK_BACKEND",
+            "online",
+        ):
+            assert get_ranks(games, Season.all_time()) == online
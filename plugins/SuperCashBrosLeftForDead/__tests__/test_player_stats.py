@@ -0,0 +1,56 @@
+from aiounittest import AsyncTestCase
+from datetime import datetime, timedelta
+
+from benchmarks.ranking import synthetic_history
+from plugins.SuperCashBrosLeftForDead.game_data import GameHistory
+from plugins.SuperCashBrosLeftForDead.player_stats import StatsIndex
+from plugins.SuperCashBrosLeftForDead.season import Season
+
+
+def summary(index):
+    return {
+        p: (s.games, s.wins, s.losses, s.margin, s.dates, s.teammates)
+        for p, s in index.players.items()
+    }
+
+
+class TestPlayerStats(AsyncTestCase):
+    async def test_stats(self):
+        games, _ = synthetic_history(12, 100)
+        history = GameHistory(games)
+        index = StatsIndex()
+        index.update(history.keys())
+
+        stats = index.get(0)
+        played = [g for g in games if 0 in g.team_one or 0 in g.team_two]
+        assert stats.games == len(played)
+        assert stats.wins + stats.losses + stats.ties == stats.games
+        assert stats.last_played == max(g.date for g in played)
+        assert sum(stats.teammates.values()) == 3 * stats.games
+        assert sum(stats.opponents.values()) == 4 * stats.games
+        margins = [
+            g.get_percent_difference() * g.get_player_team_modifier(0)
+            for g in played
+        ]
+        assert abs(stats.average_margin - sum(margins) / len(margins)) < 1e-9
+        assert index.get(100) is None
+
+        recent = [g for g in played if datetime.now() - g.date < timedelta(7)]
+        assert stats.season_games(Season(7, 1)) == len(recent)
+        assert stats.is_placed(Season.all_time())
+
+    async def test_incremental(self):
+        games, _ = synthetic_history(12, 100)
+        keys = GameHistory(games).keys()
+        index = StatsIndex()
+        index.update(keys[:80])
+        index.update(keys)
+        fresh = StatsIndex()
+        fresh.update(keys)
+        assert summary(index) == summary(fresh)
+
+        # Changed rows rebuild the index.
+        index.update(keys[10:])
+        fresh = StatsIndex()
+        fresh.update(keys[10:])
+        assert summary(index) == summary(fresh)
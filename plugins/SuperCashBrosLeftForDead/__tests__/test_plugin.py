@@ -4,16 +4,28 @@ from aiounittest import AsyncTestCase
 from unittest.mock import AsyncMock, patch
 from datetime import datetime, timedelta
 from random import randint, shuffle
-from statistics import mean
+from statistics import mean, pvariance
 
 from discord.channel import TextChannel
 from discord.ext.commands.bot import Bot
 from discord.member import Member
 
 from models.lobby import Lobby
-from plugins.SuperCashBrosLeftForDead.ranker import get_ranks
+from utils.verses import from_mask, get_template
+from plugins.SuperCashBrosLeftForDead.ranker import (
+    get_ranks,
+    rank_masks,
+    score_masks,
+    top_matches,
+)
 from plugins.SuperCashBrosLeftForDead.game_data import Game, Team
-from plugins.SuperCashBrosLeftForDead.plugin import leaderboard, ranked, rank
+from plugins.SuperCashBrosLeftForDead.plugin import (
+    leaderboard,
+    rank,
+    ranked,
+    stats,
+)
+from utils.usage_exception import UsageException
 
 
 def noop(*args, **kwargs):
@@ -42,6 +54,10 @@ def member(id: int) -> Member:
     return member
 
 
+def masks_in_order():
+    return get_template(8, [4, 4])
+
+
 def _add_game(data, ids, date=datetime.today()):
     shuffle(ids)
     team_one = Team(ids[4:], randint(1000, 3000))
@@ -70,6 +86,45 @@ class TestSuperCashBrosLeftForDead(AsyncTestCase):
         await ranked(lobby, ctx)
         assert draw_composite.await_count == 1
 
+    @patch("plugins.SuperCashBrosLeftForDead.plugin.draw_composite")
+    async def test_ranked_three_teams(self, draw_composite, get_games):
+        draw_composite.return_value = "assets/coach_small.png"
+        get_games.return_value = (game_data_future := asyncio.Future())
+        game_data_future.set_result([])
+
+        topic = """
+            @SuperCashBrosLeftForDead(history: 'patched')
+            @teams([2, 2, 2])
+        """
+        lobby = Lobby(bot(), ctx := channel(topic=topic))
+        for id in range(8):
+            await lobby.ready(member(id + 1))
+
+        await ranked(lobby, ctx)
+        teams = draw_composite.await_args.args[1]
+        assert [len(team) for team in teams] == [2, 2, 2]
+
+    @patch("plugins.SuperCashBrosLeftForDead.plugin.draw_composite")
+    async def test_concurrent_ranked(self, draw_composite, get_games):
+        draw_composite.return_value = "assets/coach_small.png"
+        get_games.return_value = []
+
+        topic = "@SuperCashBrosLeftForDead(history: 'patched')"
+        lobby = Lobby(bot(), ctx := channel(topic=topic))
+        for id in range(8):
+            await lobby.ready(member(id + 1))
+
+        run_matchmaking = lobby.run_matchmaking
+
+        async def slow_matchmaking(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return await run_matchmaking(*args, **kwargs)
+
+        lobby.run_matchmaking = slow_matchmaking
+        await asyncio.gather(*[ranked(lobby, ctx) for _ in range(3)])
+        shown = [call.args[0] for call in draw_composite.await_args_list]
+        assert sorted(shown) == [0, 1, 2]
+
     async def test_ranking_order(self, get_games):
         games = []
         get_games.return_value = (future := asyncio.Future())
@@ -104,6 +159,54 @@ class TestSuperCashBrosLeftForDead(AsyncTestCase):
             assert next_diff >= last_diff
             last_diff = next_diff
 
+    async def test_rank_masks_order(self, _get_games):
+        lobby = Lobby(bot(), channel(topic="@teams([4, 4])"))
+        for id in range(8):
+            await lobby.ready(member(id))
+
+        ranks = [randint(1000, 4000) for _ in range(8)]
+        players, _ = lobby.get_players()
+        masks = lobby.get_match_masks()
+        await rank_masks(masks, ranks)
+        last_diff = -1
+        for mask in masks:
+            one, two = from_mask(mask, players)
+            mean_1 = mean([ranks[p.member.id] for p in one])
+            mean_2 = mean([ranks[p.member.id] for p in two])
+            next_diff = abs(mean_1 - mean_2)
+            assert next_diff >= last_diff
+            last_diff = next_diff
+
+    async def test_score_masks(self, _get_games):
+        lobby = Lobby(bot(), channel(topic="@teams([1, 2, 2])"))
+        for id in range(5):
+            await lobby.ready(member(id))
+
+        ranks = [randint(1000, 4000) for _ in range(5)]
+        players, _ = lobby.get_players()
+        masks = lobby.get_match_masks()
+        scores = {
+            objective: score_masks(masks, ranks, objective)
+            for objective in ["mean", "sum", "variance"]
+        }
+        for i, mask in enumerate(masks):
+            teams = from_mask(mask, players)
+            teams = [[ranks[p.member.id] for p in t] for t in teams]
+            sums = [sum(t) for t in teams]
+            means = [mean(t) for t in teams]
+            assert abs(scores["sum"][i] - (max(sums) - min(sums))) < 1e-6
+            assert abs(scores["mean"][i] - (max(means) - min(means))) < 1e-6
+            assert abs(scores["variance"][i] - pvariance(means)) < 1e-6
+
+    @patch("plugins.SuperCashBrosLeftForDead.ranker.CHUNK_SIZE", 7)
+    async def test_top_matches_order(self, _get_games):
+        for ranks in [[2000, 2500] * 4, [randint(1, 5) for _ in range(8)]]:
+            masks = list(get_template(8, [4, 4]))
+            await rank_masks(masks, ranks)
+            for page_size in [1, 3, 10, 35, 50]:
+                top = top_matches(masks_in_order, ranks, page_size)
+                assert list(top) == masks
+
     async def test_all_ranked_players(self, game_data):
         games = []
         game_data.return_value = (future := asyncio.Future())
@@ -144,3 +247,25 @@ class TestSuperCashBrosLeftForDead(AsyncTestCase):
         assert ctx.send.await_count == 1
         embed = ctx.send.await_args_list[0].kwargs["embed"]
         assert len(embed.fields) == 16
+
+    async def test_stats(self, game_data):
+        game_data.return_value = (games := [])
+        ids = [id + 1 for id in range(8)]
+        [_add_game(games, ids) for _ in range(5)]
+
+        topic = "@SuperCashBrosLeftForDead(history: 'stats')"
+        lobby = Lobby(bot(), ctx := channel(topic=topic))
+        for id in ids:
+            await lobby.ready(member(id))
+
+        await stats(lobby, ctx, "3")
+        embed = ctx.send.await_args.kwargs["embed"]
+        assert embed.fields[0].value.startswith("5: ")
+        assert len(embed.fields) == 6
+
+        await stats(lobby, ctx, "<@42>")
+        embed = ctx.send.await_args.kwargs["embed"]
+        assert embed.description == "No games played yet."
+
+        with self.assertRaises(UsageException):
+            await stats(lobby, ctx, "nobody")
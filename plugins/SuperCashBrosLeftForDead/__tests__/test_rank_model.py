@@ -0,0 +1,177 @@
+import subprocess
+import sys
+from aiounittest import AsyncTestCase
+from datetime import datetime, timedelta
+from random import randint, sample, seed
+
+from numpy import array, sqrt
+from numpy.linalg import lstsq
+
+from plugins.SuperCashBrosLeftForDead.game_data import Game, Team
+from plugins.SuperCashBrosLeftForDead.rank_model import (
+    RankCache,
+    RankModel,
+    game_key,
+)
+from plugins.SuperCashBrosLeftForDead.ranker import (
+    RANKS,
+    get_ranks,
+    get_season_ranks,
+)
+from plugins.SuperCashBrosLeftForDead.season import Season
+
+import plugins.SuperCashBrosLeftForDead.ranking_config as rc
+
+TODAY = datetime.combine(datetime.today().date(), datetime.min.time())
+
+
+def random_games(count, days_back, num_players=24):
+    games = []
+    for _ in range(count):
+        ids = sample(range(num_players), 8)
+        games.append(
+            Game(
+                TODAY - timedelta(days=randint(0, days_back)),
+                Team(ids[:4], randint(500, 3000)),
+                Team(ids[4:], randint(500, 3000)),
+            )
+        )
+
+    return games
+
+
+def keys(games):
+    return [game_key(g) for g in games]
+
+
+def reference_coefficients(games, players):
+    # Weighted least squares with an intercept, straight from the rows.
+    X = array(
+        [[g.get_player_team_modifier(p) for p in players] for g in games],
+        dtype=float,
+    )
+    y = array([g.get_percent_difference() for g in games])
+    newest = max(g.date for g in games)
+    w = array(
+        [
+            0.5 ** ((newest - g.date).days / rc.GAME_WEIGHT_HALFLIFE_DAYS)
+            * (g.team_one.score + g.team_two.score)
+            for g in games
+        ]
+    )
+    X = X - w @ X / w.sum()
+    y = y - w @ y / w.sum()
+    return lstsq(X * sqrt(w)[:, None], y * sqrt(w), rcond=None)[0]
+
+
+def differ(a, b):
+    # Full lobbies can't tell a shift of every rating apart, so only
+    # compare ratings relative to each other.
+    return abs((a - a.mean()) - (b - b.mean())).max()
+
+
+class TestRankModel(AsyncTestCase):
+    async def test_matches_direct_fit(self):
+        seed(0)
+        games = random_games(200, 300)
+        model = RankModel()
+        model.update(keys(games))
+        players = model.players(0)
+        assert sorted(players) == sorted(Season.all_time().get_players(games))
+
+        expected = reference_coefficients(games, players)
+        assert differ(model.solve(players), expected) < 1e-9
+
+    async def test_repeated_players(self):
+        # A player listed on both teams plays for team one.
+        seed(4)
+        games = random_games(60, 30, num_players=10)
+        games.append(Game(TODAY, Team([1, 2, 2], 800), Team([2, 3], 600)))
+        model = RankModel()
+        model.update(keys(games))
+        players = model.players(0)
+        expected = reference_coefficients(games, players)
+        assert differ(model.solve(players), expected) < 1e-9
+
+    async def test_incremental_update(self):
+        seed(1)
+        games = random_games(150, 300)
+        model = RankModel()
+        model.update(keys(games))
+
+        # Drop some games, add newer ones so the older games age.
+        games = games[20:] + random_games(10, 0)
+        games.append(
+            Game(
+                TODAY + timedelta(days=3), Team([1, 2], 900), Team([3, 4], 700)
+            )
+        )
+        model.update(keys(games))
+
+        fresh = RankModel()
+        fresh.update(keys(games))
+        players = fresh.players(0)
+        assert sorted(model.players(0)) == sorted(players)
+        assert differ(model.solve(players), fresh.solve(players)) < 1e-9
+        expected = reference_coefficients(games, players)
+        assert differ(model.solve(players), expected) < 1e-9
+
+    async def test_cache(self):
+        seed(2)
+        games = random_games(100, 60)
+        cache = RankCache()
+
+        def solve(model, players):
+            return dict(zip(players, model.solve(players)))
+
+        first = cache.get(games, Season.all_time(), solve)
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert cache.get(games, Season.all_time(), solve) == first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # Ranks handed out are copies.
+        first.clear()
+        assert cache.get(games, Season.all_time(), solve)
+        assert (cache.hits, cache.misses) == (2, 1)
+
+        games = games + random_games(1, 0)
+        cache.get(games, Season.all_time(), solve)
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    async def test_get_ranks(self):
+        seed(3)
+        games = random_games(120, 200)
+        ranks = get_ranks(games, Season.all_time())
+        assert ranks.keys() == set(Season.all_time().get_players(games))
+        assert get_ranks(games, Season.all_time()) == ranks
+
+    async def test_season_ranks(self):
+        seed(5)
+        games = random_games(200, 300)
+        seasons = [Season.all_time(), Season(90, 3), Season(30, 2)]
+        RANKS.clear()
+        misses = RANKS.misses
+        together = get_season_ranks(games, seasons)
+        assert RANKS.misses == misses + 3
+
+        # The longer seasons started from the shorter ones' models but
+        # match fitting each on its own.
+        RANKS.clear()
+        alone = [get_ranks(games, season) for season in seasons]
+        assert together == alone
+        assert alone[0] != alone[1] != alone[2]
+
+    def test_lazy_imports(self):
+        # Creating a lobby imports the plugin, that shouldn't pull in
+        # the heavy ranking or Google Sheets libraries.
+        script = (
+            "import sys, plugins.SuperCashBrosLeftForDead.plugin;"
+            "print(sorted({'scipy', 'sklearn', 'gsheets'} & set(sys.modules)))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "[]"
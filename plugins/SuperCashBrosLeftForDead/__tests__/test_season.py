@@ -0,0 +1,65 @@
+from aiounittest import AsyncTestCase
+from datetime import datetime, timedelta
+from random import randint, sample, seed
+
+from plugins.SuperCashBrosLeftForDead.game_data import (
+    Game,
+    GameHistory,
+    Team,
+    game_key,
+)
+from plugins.SuperCashBrosLeftForDead.ranker import RANKS, get_ranks
+from plugins.SuperCashBrosLeftForDead.season import Season
+
+
+class TestSeason(AsyncTestCase):
+    async def test_history_matches_list(self):
+        seed(0)
+        today = datetime.combine(datetime.today().date(), datetime.min.time())
+        games = []
+        for _ in range(300):
+            ids = sample(range(30), 8)
+            date = today - timedelta(days=randint(0, 400))
+            games.append(Game(date, Team(ids[:4], 100), Team(ids[4:], 90)))
+
+        history = GameHistory(games)
+        assert history.dates.tolist() == sorted(g.date for g in games)
+        assert sorted(history.keys()) == sorted(map(game_key, games))
+        assert [game_key(g) for g in history] == history.keys()
+        seasons = [Season.all_time(), Season.current(), Season(7, 2)]
+        for season in seasons:
+            expected = season.get_games(games)
+            found = season.get_games(history)
+            assert isinstance(found, GameHistory)
+            assert sorted(found.keys()) == sorted(map(game_key, expected))
+            assert season.get_players(history) == season.get_players(games)
+
+        played = [g for g in games if 0 in g.team_one or 0 in g.team_two]
+        assert history.count_games(None)[0] == len(played)
+        assert history.start(None) == 0
+        assert history.start(today) == len(games)
+
+    async def test_history_ranks(self):
+        seed(1)
+        today = datetime.combine(datetime.today().date(), datetime.min.time())
+        games = []
+        for _ in range(200):
+            ids = sample(range(20), 8)
+            date = today - timedelta(days=randint(0, 200))
+            one = Team(ids[:4], randint(500, 3000))
+            games.append(Game(date, one, Team(ids[4:], randint(500, 3000))))
+
+        history = GameHistory(games)
+        assert game_key(history[-1]) == history.keys()[-1]
+        assert len(history[10:20]) == 10
+        assert history[10:20].keys() == history.keys()[10:20]
+        for season in [Season.all_time(), Season.current()]:
+            RANKS.clear()
+            expected = get_ranks(games, season)
+            RANKS.clear()
+            assert get_ranks(history, season) == expected
+
+        empty = GameHistory()
+        assert len(empty) == 0 and empty.keys() == []
+        assert empty.count_games(None) == {}
+        assert get_ranks(empty, Season.all_time()) == {}
@@ -0,0 +1,79 @@
+from aiounittest import AsyncTestCase
+from itertools import islice
+from random import randint, seed
+
+from plugins.SuperCashBrosLeftForDead.solver import (
+    balanced_matches,
+    best_matches,
+)
+from plugins.SuperCashBrosLeftForDead.ranker import score_masks
+from utils.constraints import Constraints
+from utils.verses import iter_masks, mask_indexes
+
+
+def spread(mask, ranks) -> float:
+    teams = [mask_indexes(team) for team in mask if team]
+    means = [sum(ranks[i] for i in team) / len(team) for team in teams]
+    return max(means) - min(means)
+
+
+class TestSolver(AsyncTestCase):
+    async def test_matches_enumeration(self):
+        seed(0)
+        shapes = [(8, [4, 4]), (5, [1, 4]), (6, [2, 2, 2]), (7, [2, 2])]
+        for num_players, teams in shapes:
+            ranks = [randint(1000, 4000) for _ in range(num_players)]
+            masks = list(iter_masks(num_players, teams))
+            expected = sorted(spread(m, ranks) for m in masks)
+
+            actual = list(balanced_matches(ranks, teams, page_size=4))
+            assert len(actual) == len(expected)
+            assert len({frozenset(m) for _, m in actual}) == len(actual)
+            for want, (score, mask) in zip(expected, actual):
+                assert abs(want - score) < 1e-9
+                assert abs(spread(mask, ranks) - score) < 1e-9
+
+    async def test_objectives(self):
+        seed(2)
+        ranks = [randint(1000, 4000) for _ in range(7)]
+        masks = list(iter_masks(7, [2, 3, 2]))
+        for objective in ["mean", "sum", "variance"]:
+            expected = sorted(score_masks(masks, ranks, objective))
+            actual = list(balanced_matches(ranks, [2, 3, 2], 5, objective))
+            assert len(actual) == len(expected)
+            for want, (score, _) in zip(expected, actual):
+                assert abs(want - score) < 1e-6
+
+    async def test_ties_page_consistently(self):
+        ranks = [2000, 2500] * 4
+        everything = best_matches(ranks, [4, 4], 35)
+        paged = list(balanced_matches(ranks, [4, 4], page_size=3))
+        assert [m for _, m in everything] == [m for _, m in paged]
+
+    async def test_large_lobby(self):
+        seed(1)
+        ranks = [randint(1000, 4000) for _ in range(24)]
+        top = list(islice(balanced_matches(ranks, [12, 12]), 10))
+        assert len(top) == 10
+        scores = [score for score, _ in top]
+        assert scores == sorted(scores)
+        for _, mask in top:
+            assert [len(mask_indexes(team)) for team in mask] == [12, 12]
+
+    async def test_constraints(self):
+        seed(3)
+        constraints = Constraints(
+            together=[[0, 1]], apart=[[2, 3, 4]], pinned={5: 2}
+        )
+        for num_players, teams in [(7, [2, 3, 2]), (9, [3, 3, 3])]:
+            ranks = [randint(1000, 4000) for _ in range(num_players)]
+            masks = iter_masks(num_players, teams, True, constraints)
+            expected = sorted(score_masks(list(masks), ranks))
+
+            actual = list(
+                balanced_matches(ranks, teams, 4, constraints=constraints)
+            )
+            assert len(actual) == len(expected)
+            for want, (score, mask) in zip(expected, actual):
+                assert abs(want - score) < 1e-9
+                assert mask[2] >> 5 & 1
@@ -0,0 +1,62 @@
+from aiounittest import AsyncTestCase
+from datetime import datetime, timedelta
+
+from benchmarks.ranking import synthetic_history
+from plugins.SuperCashBrosLeftForDead.game_data import (
+    Game,
+    GameHistory,
+    Team,
+)
+from plugins.SuperCashBrosLeftForDead.ranker import score_masks
+from plugins.SuperCashBrosLeftForDead.synergy import SynergyIndex
+from utils.verses import iter_masks
+
+
+class TestSynergy(AsyncTestCase):
+    async def test_incremental(self):
+        games, _ = synthetic_history(12, 100)
+        keys = GameHistory(games).keys()
+        index = SynergyIndex()
+        index.update(keys[:60])
+        index.update(keys[20:])
+        fresh = SynergyIndex()
+        fresh.update(keys[20:])
+        assert index.players.keys() == fresh.players.keys()
+        assert index.pairs.keys() == fresh.pairs.keys()
+        for pair, (n, margin) in fresh.pairs.items():
+            assert index.pairs[pair][0] == n
+            assert abs(index.pairs[pair][1] - margin) < 1e-9
+
+    async def test_pair_wins_together(self):
+        today = datetime.today()
+        games = []
+        for day in range(20):
+            date = today - timedelta(days=day)
+            # 0 and 1 win when together and lose when apart.
+            if day % 2:
+                one, two = Team([0, 1, 2, 3], 200), Team([4, 5, 6, 7], 100)
+            else:
+                one, two = Team([0, 2, 4, 6], 100), Team([1, 3, 5, 7], 200)
+            games.append(Game(date, one, two))
+
+        index = SynergyIndex()
+        index.update(GameHistory(games).keys())
+        assert index.synergy(0, 1) > 0
+        assert index.synergy(1, 0) == index.synergy(0, 1)
+        assert index.synergy(4, 5) < 0
+        assert index.synergy(0, 100) == 0
+
+        matrix = index.matrix([0, 1, 2], 10)
+        assert matrix[0][1] == matrix[1][0] == 10 * index.synergy(0, 1)
+        assert matrix[0][0] == 0
+
+    async def test_score_masks(self):
+        ranks = [1.0] * 8
+        synergy = [[0.0] * 8 for _ in range(8)]
+        synergy[0][1] = synergy[1][0] = 3.0
+        matches = list(iter_masks(8, [4, 4]))
+        plain = score_masks(matches, ranks, "sum")
+        scored = score_masks(matches, ranks, "sum", synergy)
+        for match, a, b in zip(matches, plain, scored):
+            together = any(team & 3 == 3 for team in match)
+            assert abs(b - a - (3.0 if together else 0.0)) < 1e-9
@@ -0,0 +1,281 @@
+from heapq import heapify, heappop, heappush
+from itertools import count, islice
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.offload import check_cancelled
+from utils.verses import MatchMask, fill_team_sizes, mask_indexes
+
+from .objectives import imbalance_of, team_values
+
+import plugins.SuperCashBrosLeftForDead.ranking_config as rc
+
+# Where a match was found: its score and how many matches the search
+# produced before it. Matches come out in the same order every time,
+# so this is enough to pick up where a previous page stopped.
+Cursor = Tuple[float, int]
+
+ESCAPE_STEPS = 16
+
+
+def heuristic_matches(
+    ranks: Sequence[float],
+    teams: Optional[List[int]],
+    k: int,
+    after: Optional[Cursor] = None,
+    objective: Optional[str] = None,
+) -> List[Tuple[Cursor, MatchMask]]:
+    """
+    The `k` matches that come after `after`, for lobbies too big to
+    search exactly. Any number of teams of any size is supported.
+
+    The first match comes from `differencing` and `greedy`, polished
+    by `local_search`. Later matches come from a best-first walk of the
+    matches around it, each one a single swap away from a match
+    already found, so every page is made of near-even matches.
+    """
+    objective = objective or rc.BALANCE_OBJECTIVE
+    sizes = fill_team_sizes(len(ranks), teams)
+    if not any(sizes) or k <= 0:
+        return []
+
+    first = _starting_match(ranks, sizes, objective)
+    skip = -1 if after is None else after[1]
+    page = []
+    for position, (score, mask) in enumerate(
+        _walk(ranks, sizes, first, objective)
+    ):
+        if position > skip:
+            page.append(((score, position), mask))
+            if len(page) == k:
+                break
+
+    return page
+
+
+def _starting_match(
+    ranks: Sequence[float], sizes: List[int], objective: str
+) -> MatchMask:
+    def score(match: MatchMask) -> float:
+        return _score(sizes, _team_sums(ranks, match), objective)
+
+    # Two quick guesses settle in different places. Start from the
+    # better of the two.
+    guesses = [
+        differencing(ranks, sizes, objective),
+        greedy(ranks, sizes, objective),
+    ]
+    guesses = [local_search(ranks, sizes, m, objective) for m in guesses]
+    match = min(guesses, key=score)
+
+    # Swapping single players can get stuck. Look a few steps around
+    # the match and carry on from anything better found there.
+    while True:
+        nearby = islice(_walk(ranks, sizes, match, objective), ESCAPE_STEPS)
+        best_score, best = min(nearby)
+        if best_score >= score(match):
+            return match
+        match = local_search(ranks, sizes, best, objective)
+
+
+def differencing(
+    ranks: Sequence[float],
+    sizes: List[int],
+    objective: Optional[str] = None,
+) -> MatchMask:
+    """
+    A Karmarkar-Karp style first guess at the most even match.
+
+    Players are taken from highest to lowest rank, one row at a time
+    with a player for each team that still has room. Each row is a
+    partial match. The two partial matches with the biggest gap
+    between their teams are then repeatedly merged, pairing the
+    strongest team of one with the weakest team of the other, until
+    a single match is left. Only teams of the same size can be
+    paired up, since team values depend on the size.
+
+    Players that don't fit on a team are taken from the middle of
+    the ranks, where sitting out changes the least.
+    """
+    objective = objective or rc.BALANCE_OBJECTIVE
+    order = sorted(range(len(ranks)), key=lambda i: ranks[i], reverse=True)
+    benched = len(ranks) - sum(sizes)
+    start = sum(sizes) // 2
+    stop = start + benched
+    order = order[:start] + order[stop:]
+
+    groups: Dict[int, List[int]] = {}
+    for t, size in enumerate(sizes):
+        if size > 0:
+            groups.setdefault(size, []).append(t)
+
+    def spread(values: List[float]) -> float:
+        scored = [v for t, v in enumerate(values) if sizes[t] > 0]
+        return max(scored) - min(scored)
+
+    tiebreak = count()
+    partials = []
+    players = iter(order)
+    for row in range(max(sizes)):
+        values = [0.0] * len(sizes)
+        masks = [0] * len(sizes)
+        for t, size in enumerate(sizes):
+            if size > row:
+                player = next(players)
+                values[t] = team_values(ranks[player], size, objective)
+                masks[t] = 1 << player
+        partials.append((-spread(values), next(tiebreak), values, masks))
+
+    heapify(partials)
+    while len(partials) > 1:
+        _, _, a_values, a_masks = heappop(partials)
+        _, _, b_values, b_masks = heappop(partials)
+        values = list(a_values)
+        masks = list(a_masks)
+        for positions in groups.values():
+            strong = sorted(positions, key=lambda t: -a_values[t])
+            weak = sorted(positions, key=lambda t: b_values[t])
+            for a, b in zip(strong, weak):
+                values[a] += b_values[b]
+                masks[a] |= b_masks[b]
+        heappush(partials, (-spread(values), next(tiebreak), values, masks))
+
+    return tuple(partials[0][3])
+
+
+def greedy(
+    ranks: Sequence[float],
+    sizes: List[int],
+    objective: Optional[str] = None,
+) -> MatchMask:
+    """
+    Places players from highest to lowest rank, each on the team
+    with the lowest value that still has room. Players that don't
+    fit sit out.
+    """
+    objective = objective or rc.BALANCE_OBJECTIVE
+    sums = [0.0] * len(sizes)
+    counts = [0] * len(sizes)
+    masks = [0] * len(sizes)
+    order = sorted(range(len(ranks)), key=lambda i: ranks[i], reverse=True)
+    for player in order:
+        open_teams = [t for t in range(len(sizes)) if counts[t] < sizes[t]]
+        if not open_teams:
+            break
+
+        t = min(
+            open_teams, key=lambda t: team_values(sums[t], sizes[t], objective)
+        )
+        sums[t] += ranks[player]
+        counts[t] += 1
+        masks[t] |= 1 << player
+
+    return tuple(masks)
+
+
+def local_search(
+    ranks: Sequence[float],
+    sizes: List[int],
+    match: MatchMask,
+    objective: Optional[str] = None,
+) -> MatchMask:
+    """
+    Improves `match` by swapping pairs of players between teams (or
+    with a player sitting out) while any swap makes it more even.
+    """
+    objective = objective or rc.BALANCE_OBJECTIVE
+    sums = _team_sums(ranks, match)
+    score = _score(sizes, sums, objective)
+    improved = True
+    while improved:
+        check_cancelled()
+        improved = False
+        for neighbour, neighbour_sums in _neighbours(ranks, match, sums):
+            neighbour_score = _score(sizes, neighbour_sums, objective)
+            if neighbour_score < score:
+                match, sums, score = neighbour, neighbour_sums, neighbour_score
+                improved = True
+                break
+
+    return match
+
+
+def _walk(
+    ranks: Sequence[float],
+    sizes: List[int],
+    start: MatchMask,
+    objective: str,
+) -> Iterator[Tuple[float, MatchMask]]:
+    """
+    Yields `start`, then whichever known match is most even, growing
+    the known matches with the neighbours of everything yielded.
+    """
+    start = _canonical(sizes, start)
+    seen = {start}
+    score = _score(sizes, _team_sums(ranks, start), objective)
+    frontier = [(score, start)]
+    while frontier:
+        check_cancelled()
+        score, match = heappop(frontier)
+        yield score, match
+        sums = _team_sums(ranks, match)
+        for neighbour, neighbour_sums in _neighbours(ranks, match, sums):
+            neighbour = _canonical(sizes, neighbour)
+            if neighbour not in seen:
+                seen.add(neighbour)
+                score = _score(sizes, neighbour_sums, objective)
+                heappush(frontier, (score, neighbour))
+
+
+def _neighbours(
+    ranks: Sequence[float], match: MatchMask, sums: List[float]
+) -> Iterator[Tuple[MatchMask, List[float]]]:
+    """
+    Every match one swap of two players away from `match`, with its
+    team totals. Players sitting out count as one more team.
+    """
+    everyone = (1 << len(ranks)) - 1
+    teams = [*match, everyone & ~sum(match)]
+    members = [mask_indexes(team) for team in teams]
+    num_teams = len(match)
+    for a in range(num_teams):
+        for b in range(a + 1, len(teams)):
+            for i in members[a]:
+                for j in members[b]:
+                    swap = 1 << i | 1 << j
+                    neighbour = list(match)
+                    neighbour_sums = list(sums)
+                    neighbour[a] ^= swap
+                    neighbour_sums[a] += ranks[j] - ranks[i]
+                    if b < num_teams:
+                        neighbour[b] ^= swap
+                        neighbour_sums[b] += ranks[i] - ranks[j]
+                    yield tuple(neighbour), neighbour_sums
+
+
+def _canonical(sizes: List[int], match: MatchMask) -> MatchMask:
+    """
+    Teams of the same size are interchangeable. Sorting them gives
+    mirrored matches the same form.
+    """
+    canonical = list(match)
+    groups: Dict[int, List[int]] = {}
+    for t, size in enumerate(sizes):
+        groups.setdefault(size, []).append(t)
+    for positions in groups.values():
+        for t, mask in zip(positions, sorted(match[t] for t in positions)):
+            canonical[t] = mask
+
+    return tuple(canonical)
+
+
+def _team_sums(ranks: Sequence[float], match: MatchMask) -> List[float]:
+    return [sum(ranks[i] for i in mask_indexes(team)) for team in match]
+
+
+def _score(sizes: List[int], sums: List[float], objective: str) -> float:
+    values = [
+        team_values(total, size, objective)
+        for total, size in zip(sums, sizes)
+        if size > 0
+    ]
+    return imbalance_of(values, objective)
@@ -36,28 +36,34 @@ ROW_HEIGHT = 42
 
 async def draw_composite(
     game_num: int,
-    survivors: List[Player],
-    infected: List[Player],
+    teams: List[List[Player]],
     channel_id: int,
     get_rank: Callable[[int], int],
 ) -> str:
-    image = blank.copy()
+    """
+    Draws one row per player, team after team. The first team plays
+    the survivors and every other team plays the infected.
+    """
+    rows = sum(len(team) for team in teams)
+    image = get_canvas(PLAYER_ONE_START + rows * ROW_HEIGHT)
     draw = ImageDraw.Draw(image)
     draw_game_number(draw, game_num)
     rc.USE_ROLLING_SEASON and draw_season_info(draw)
 
     ops = []
-    for index, player in enumerate(survivors):
-        character = survivor_characters[index]
-        rank = get_rank_image(get_rank(player.member.id))
-        y_offset = index * ROW_HEIGHT
-        ops.append(draw_player(draw, image, player, character, rank, y_offset))
-
-    character = infected_character
-    for index, player in enumerate(infected):
-        y_offset = (index + len(survivors)) * ROW_HEIGHT
-        rank = get_rank_image(get_rank(player.member.id))
-        ops.append(draw_player(draw, image, player, character, rank, y_offset))
+    row = 0
+    for team_num, team in enumerate(teams):
+        for index, player in enumerate(team):
+            character = infected_character
+            if team_num == 0:
+                survivors = len(survivor_characters)
+                character = survivor_characters[index % survivors]
+            rank = get_rank_image(get_rank(player.member.id))
+            y_offset = row * ROW_HEIGHT
+            ops.append(
+                draw_player(draw, image, player, character, rank, y_offset)
+            )
+            row += 1
 
     if len(ops) > 0:
         await asyncio.wait(ops)
@@ -66,6 +72,23 @@ async def draw_composite(
     return filename
 
 
+def get_canvas(height: int) -> Image:
+    """
+    The blank lobby image, stretched with its bottom row of pixels
+    when there are more players than it has room for.
+    """
+    if height <= blank.height:
+        return blank.copy()
+
+    image = Image.new(blank.mode, (blank.width, height))
+    image.paste(blank, (0, 0))
+    edge = blank.crop((0, blank.height - 1, blank.width, blank.height))
+    image.paste(
+        edge.resize((blank.width, height - blank.height)), (0, blank.height)
+    )
+    return image
+
+
 def draw_game_number(draw: ImageDraw.Draw, shuffle_num: int) -> None:
     text = f"Match {shuffle_num + 1}"
     draw.text((10, 10), text, font=shuffle_font, fill=(81, 81, 81, 255))
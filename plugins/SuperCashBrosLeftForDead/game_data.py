@@ -1,10 +1,33 @@
+import asyncio
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from time import monotonic
 from utils.handle import handle
 from utils.usage_exception import UsageException
 from discord.channel import TextChannel
-from gsheets import Sheets
-from typing import List
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    overload,
+)
+
+from numpy import arange, array, concatenate, cumsum, datetime64, diff
+from numpy import errstate, int8, int64, repeat, searchsorted, sort, tile
+from numpy import unique, zeros
+
+import plugins.SuperCashBrosLeftForDead.ranking_config as rc
+
+if TYPE_CHECKING:
+    from gsheets import Sheets
+
+GameKey = Tuple[datetime, Tuple[int, ...], float, Tuple[int, ...], float]
 
 
 class Team:
@@ -38,20 +61,281 @@ class Game:
         return 0
 
 
+def game_key(game: Game) -> GameKey:
+    """Everything about a game that affects the rank model."""
+    return (
+        game.date,
+        tuple(game.team_one.players),
+        game.team_one.score,
+        tuple(game.team_two.players),
+        game.team_two.score,
+    )
+
+
+class GameHistory:
+    """
+    Games sorted from oldest to newest, stored column by column rather
+    than as `Game` objects:
+
+    - `dates`, `scores` (team one, team two) and `margins` (what
+      `Game.get_percent_difference` returns) have a row per game.
+    - `players` and `signs` list who played in each game (+1 on team
+      one, -1 on team two), with game `i` at `indptr[i]:indptr[i + 1]`
+      the way a CSR matrix stores its rows.
+    - `ids` are the distinct player ids, and `columns` is the position
+      in `ids` of each entry of `players`.
+
+    It reads like a list of games: indexing with a number makes a
+    `Game`, and slicing gives a smaller history. Treat it as read-only.
+    """
+
+    def __init__(self, games: Iterable[Game] = ()):
+        games = sorted(games, key=lambda g: g.date)
+        one = [g.team_one.players for g in games]
+        two = [g.team_two.players for g in games]
+        sizes = [len(p) for team in zip(one, two) for p in team]
+        self.dates = array([g.date for g in games], dtype="datetime64[us]")
+        self.scores = array(
+            [(g.team_one.score, g.team_two.score) for g in games],
+            dtype=float,
+        ).reshape(-1, 2)
+        ends = cumsum(sizes, dtype=int64)[1::2]
+        self.indptr = concatenate([zeros(1, dtype=int64), ends])
+        self.players = array(
+            [p for team in zip(one, two) for ps in team for p in ps],
+            dtype=int64,
+        )
+        self.signs = repeat(
+            tile(array([1, -1], dtype=int8), len(games)), sizes
+        )
+        self._index()
+
+    def _index(self) -> None:
+        one, two = self.scores.T
+        with errstate(divide="ignore", invalid="ignore"):
+            self.margins = (one - two) / (one + two)
+        self.ids, self.columns = unique(self.players, return_inverse=True)
+        # Every entry sorted by player, then by game. The games of
+        # player `c` after game `i` are then a range found by bisection.
+        games = repeat(arange(len(self)), diff(self.indptr))
+        self._by_player = sort(self.columns * (len(self) + 1) + games)
+        self._player_ends = searchsorted(
+            self._by_player, (arange(len(self.ids)) + 1) * (len(self) + 1)
+        )
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __iter__(self) -> Iterator[Game]:
+        return (self[i] for i in range(len(self)))
+
+    @overload
+    def __getitem__(self, i: int) -> Game: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> "GameHistory": ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                raise ValueError("GameHistory slices can't skip games")
+            return self._window(start, max(start, stop))
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("game index out of range")
+        low, high = self.indptr[i], self.indptr[i + 1]
+        entries = list(zip(self.players[low:high], self.signs[low:high]))
+        one, two = self.scores[i].tolist()
+        return Game(
+            self.dates[i].item(),
+            Team([int(p) for p, s in entries if s > 0], one),
+            Team([int(p) for p, s in entries if s < 0], two),
+        )
+
+    def _window(self, start: int, stop: int) -> "GameHistory":
+        window = GameHistory.__new__(GameHistory)
+        low, high = self.indptr[start], self.indptr[stop]
+        window.dates = self.dates[start:stop]
+        window.scores = self.scores[start:stop]
+        end = stop + 1
+        window.indptr = self.indptr[start:end] - low
+        window.players = self.players[low:high]
+        window.signs = self.signs[low:high]
+        window._index()
+        return window
+
+    def start(self, after: Optional[datetime]) -> int:
+        """The position of the first game played after `after`."""
+        if after is None:
+            return 0
+        return int(searchsorted(self.dates, datetime64(after), "right"))
+
+    def count_games(self, after: Optional[datetime]) -> Dict[int, int]:
+        """How many games each player played after `after`."""
+        first = self.start(after)
+        starts = searchsorted(
+            self._by_player, arange(len(self.ids)) * (len(self) + 1) + first
+        )
+        counts = self._player_ends - starts
+        played = counts > 0
+        return dict(zip(self.ids[played].tolist(), counts[played].tolist()))
+
+    def keys(self) -> List[GameKey]:
+        """`game_key` of every game, without making `Game` objects."""
+        dates = self.dates.tolist()
+        players = self.players.tolist()
+        signs = self.signs.tolist()
+        indptr = self.indptr.tolist()
+        scores = self.scores.tolist()
+        keys = []
+        for i, (one, two) in enumerate(scores):
+            entries = range(indptr[i], indptr[i + 1])
+            keys.append(
+                (
+                    dates[i],
+                    tuple(players[e] for e in entries if signs[e] > 0),
+                    one,
+                    tuple(players[e] for e in entries if signs[e] < 0),
+                    two,
+                )
+            )
+
+        return keys
+
+
+# Sheets are downloaded on these threads. The Google client only
+# makes blocking calls, which would stall every channel if they were
+# made on the event loop.
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=rc.SHEETS_WORKERS, thread_name_prefix="sheets"
+        )
+    return _executor
+
+
+# Each download thread keeps its own Google client. Making one reads
+# the credentials from disk and builds both API services, and its
+# connections stay open between downloads. The oauth2client
+# credentials refresh the access token themselves when it expires.
+# httplib2 connections aren't thread safe, so threads don't share.
+_clients = threading.local()
+
+
+def get_client() -> "Sheets":
+    """This thread's Google client, made on first use."""
+    client = getattr(_clients, "sheets", None)
+    if client is None:
+        # The Google API client is slow to import and only needed here.
+        from gsheets import Sheets
+
+        client = Sheets.from_files("client_secrets.json", "oath_cache.json")
+        _clients.sheets = client
+    return client
+
+
+class HistoryCache:
+    """
+    The last history loaded from each sheet. For `SHEETS_CACHE_SECONDS`
+    after a load it's used as is. After that the sheet's revision is
+    checked first, and it's only downloaded again if it changed.
+
+    `hits` counts fetches that didn't ask Google at all, `revalidated`
+    the ones that only checked the revision and `misses` the ones that
+    downloaded the sheet.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        # id => (when it was checked, revision, history)
+        self._entries: Dict[str, Tuple[float, Optional[str], GameHistory]] = {}
+
+    def get(self, id: str) -> Optional[GameHistory]:
+        """The history of `id`, if it's recent enough to skip checking."""
+        entry = self._entries.get(id)
+        if entry is None:
+            return None
+        checked, _, history = entry
+        if monotonic() - checked >= rc.SHEETS_CACHE_SECONDS:
+            return None
+        self.hits += 1
+        return history
+
+    def revision(self, id: str) -> Optional[str]:
+        entry = self._entries.get(id)
+        return entry[1] if entry else None
+
+    def unchanged(self, id: str) -> GameHistory:
+        """Marks the cached history of `id` as checked just now."""
+        _, revision, history = self._entries[id]
+        self._entries[id] = (monotonic(), revision, history)
+        self.revalidated += 1
+        return history
+
+    def put(
+        self, id: str, revision: Optional[str], history: GameHistory
+    ) -> None:
+        self._entries[id] = (monotonic(), revision, history)
+        self.misses += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+HISTORIES = HistoryCache()
+
+
+# Loads in progress, by sheet ID. Everyone asking for a sheet while
+# it loads waits on the same load.
+_loading: Dict[str, "asyncio.Future[GameHistory]"] = {}
+
+
 class GameData:
     @staticmethod
-    async def fetch(id: str, channel: TextChannel) -> List[Game]:
-        url = f"https://docs.google.com/spreadsheets/d/{id}"
+    async def fetch(id: str, channel: TextChannel) -> GameHistory:
+        history = HISTORIES.get(id)
+        if history is not None:
+            return history
+
+        load = _loading.get(id)
+        if load is None:
+            load = asyncio.ensure_future(GameData._load(id))
+            _loading[id] = load
+            load.add_done_callback(lambda done: GameData._loaded(id, done))
+
+        try:
+            # Shielded so one caller giving up doesn't cancel the others.
+            return await asyncio.shield(load)
+        except BaseException:
+            url = f"https://docs.google.com/spreadsheets/d/{id}"
+            raise UsageException.game_sheet_not_loaded(channel, url)
+
+    @staticmethod
+    async def _load(id: str) -> GameHistory:
         try:
-            sheets_fetcher = Sheets.from_files(
-                "client_secrets.json",
-                "oath_cache.json",
+            loop = asyncio.get_running_loop()
+            known = HISTORIES.revision(id)
+            download = loop.run_in_executor(
+                get_executor(), GameData._download, id, known
             )
-            sheets = sheets_fetcher.get(url)
+            timeout = rc.SHEETS_TIMEOUT_SECONDS
+            revision, rows = await asyncio.wait_for(download, timeout)
+            if rows is None:
+                return HISTORIES.unchanged(id)
+
             games: List[Game] = []
             # Must be the first sheet
             # Skip headers
-            for row in sheets._sheets[0]._values[1:]:
+            for row in rows[1:]:
                 try:
                     games.append(
                         Game(
@@ -63,7 +347,44 @@ class GameData:
                 except BaseException as exception:
                     await handle(None, exception)
 
-            return games
+            history = GameHistory(games)
+            HISTORIES.put(id, revision, history)
+            return history
         except BaseException as exception:
+            # Logged once here, every waiter reports it to its channel.
             await handle(None, exception)
-            raise UsageException.game_sheet_not_loaded(channel, url)
+            raise
+
+    @staticmethod
+    def _loaded(id: str, load: "asyncio.Future[GameHistory]") -> None:
+        if _loading.get(id) is load:
+            del _loading[id]
+        if not load.cancelled():
+            load.exception()  # retrieved, even if every waiter left
+
+    @staticmethod
+    def _download(
+        id: str, known: Optional[str]
+    ) -> Tuple[Optional[str], Optional[List[List]]]:
+        """
+        The sheet's revision and the rows of its first sheet. The rows
+        are None when the revision is still `known`. This blocks, see
+        `fetch`.
+        """
+        client = get_client()
+        try:
+            try:
+                files = client._drive.files()
+                revision = files.get(fileId=id, fields="version").execute()
+                revision = revision["version"]
+            except Exception:
+                revision = None  # no way to tell, so always download
+            if revision is not None and revision == known:
+                return revision, None
+
+            url = f"https://docs.google.com/spreadsheets/d/{id}"
+            sheets = client.get(url)
+            return revision, sheets._sheets[0]._values
+        except BaseException:
+            _clients.sheets = None  # start over with a fresh client
+            raise
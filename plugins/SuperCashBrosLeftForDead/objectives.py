@@ -0,0 +1,48 @@
+from statistics import pvariance
+from typing import List
+
+import numpy as np
+
+OBJECTIVES = ["mean", "sum", "variance"]
+
+
+def team_values(sums: np.ndarray, sizes: np.ndarray, objective: str):
+    """
+    The per-team number an objective compares. Works on scalars as
+    well as arrays. "sum" compares totals, everything else averages.
+    """
+    return sums if objective == "sum" else sums / sizes
+
+
+def imbalance(team_sums: np.ndarray, sizes: np.ndarray, objective: str):
+    """
+    Scores many matches at once. `team_sums` has one row per match
+    and one column per team; `sizes` holds the matching team sizes.
+    Lower is better and a perfectly even match scores zero.
+    """
+    values = team_values(team_sums, sizes, objective)
+    if objective == "variance":
+        return values.var(axis=1)
+
+    return values.max(axis=1) - values.min(axis=1)
+
+
+def imbalance_of(values: List[float], objective: str) -> float:
+    """The scalar version of `imbalance`, given `team_values`."""
+    if objective == "variance":
+        return pvariance(values)
+
+    return max(values) - min(values)
+
+
+def imbalance_bound(spread: float, num_teams: int, objective: str) -> float:
+    """
+    Converts a lower bound on the spread of `team_values` into a lower
+    bound on the objective. With the spread fixed, the variance is
+    smallest when two teams sit at the extremes and the rest sit in
+    the middle, which gives `spread ** 2 / (2 * num_teams)`.
+    """
+    if objective == "variance":
+        return spread**2 / (2 * num_teams)
+
+    return spread
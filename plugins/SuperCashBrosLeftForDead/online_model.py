@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from numpy import array, ndarray
+
+from .game_data import GameKey
+
+import plugins.SuperCashBrosLeftForDead.ranking_config as rc
+
+
+class OnlineRatings:
+    """
+    A rating per player, updated one game at a time instead of fitting
+    the whole season at once. It uses the same model as `RankModel`:
+    a game's score difference is predicted by the ratings of team one
+    minus the ratings of team two, plus a shared bias.
+
+    After each game everyone in it moves towards explaining the
+    prediction error, weighted by the game's points. How far they move
+    depends on how much evidence is behind their rating, and that
+    evidence fades with `GAME_WEIGHT_HALFLIFE_DAYS` while they don't
+    play. New players move a lot, regulars move a little and players
+    coming back after a break catch up quickly.
+
+    Games are taken in date order. New games at the end of the history
+    cost O(team size) each. Anything else (an edit, or an old game
+    dropping out of a rolling season) replays the history.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self) -> None:
+        self.history: List[GameKey] = []
+        self.ratings: Dict[Optional[int], float] = {}
+        self.evidence: Dict[Optional[int], float] = {}
+        self.last: Dict[Optional[int], datetime] = {}
+        self.counts: Dict[int, int] = {}
+
+    def update(self, games: List[GameKey]) -> None:
+        """Brings the ratings in line with exactly `games` (see `game_key`)."""
+        keys = sorted(games, key=lambda k: k[0])
+        done = len(self.history)
+        if keys[:done] != self.history:
+            self._reset()
+            done = 0
+
+        for key in keys[done:]:
+            self._add(key)
+        self.history = keys
+
+    def players(self, placements: int) -> List[int]:
+        """Everyone with at least `placements` games (and at least one)."""
+        placements = max(1, placements)
+        return [p for p, n in self.counts.items() if n >= placements]
+
+    def solve(self, players: List[int]) -> ndarray:
+        """The current rating of each of `players`."""
+        return array([self.ratings[p] for p in players])
+
+    def _add(self, key: GameKey) -> None:
+        date, team_one, score_one, team_two, score_two = key
+        # The bias is a stand-in player on every team one.
+        modifiers: Dict[Optional[int], int] = {p: -1 for p in team_two}
+        modifiers.update({p: 1 for p in team_one})
+        modifiers[None] = 1
+
+        weight = float(score_one + score_two)
+        target = float(score_one - score_two) / weight
+        predicted = sum(
+            m * self.ratings.get(p, 0.0) for p, m in modifiers.items()
+        )
+        error = (target - predicted) / len(modifiers)
+
+        for player, modifier in modifiers.items():
+            evidence = self.evidence.get(player, 0.0)
+            if player in self.last:
+                days = (date - self.last[player]).days
+                evidence *= 0.5 ** (days / rc.GAME_WEIGHT_HALFLIFE_DAYS)
+
+            gain = weight / (evidence + weight)
+            rating = self.ratings.get(player, 0.0)
+            self.ratings[player] = rating + gain * modifier * error
+            self.evidence[player] = evidence + weight
+            self.last[player] = date
+
+        for player in team_one + team_two:
+            self.counts[player] = self.counts.get(player, 0) + 1
@@ -0,0 +1,105 @@
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .game_data import GameKey
+from .season import Season
+
+
+class PlayerStats:
+    """What one player's games add up to."""
+
+    def __init__(self, player: int):
+        self.player = player
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.margin = 0.0  # sum of score differences, from their side
+        self.dates: List[datetime] = []  # oldest first
+        self.teammates: Counter = Counter()
+        self.opponents: Counter = Counter()
+
+    @property
+    def ties(self) -> int:
+        return self.games - self.wins - self.losses
+
+    @property
+    def average_margin(self) -> float:
+        return self.margin / self.games if self.games else 0.0
+
+    @property
+    def last_played(self) -> Optional[datetime]:
+        return self.dates[-1] if self.dates else None
+
+    def season_games(self, season: Season) -> int:
+        """How many games count towards `season`."""
+        cutoff = season.get_cutoff()
+        start = 0 if cutoff is None else bisect_right(self.dates, cutoff)
+        return len(self.dates) - start
+
+    def is_placed(self, season: Season) -> bool:
+        """Whether they played enough games to be ranked in `season`."""
+        return self.season_games(season) >= max(1, season.placements)
+
+
+class StatsIndex:
+    """
+    Every player's stats for one game history. Games are taken in
+    date order, so rows added to the end of the sheet only cost their
+    own games. Anything else (an edit or a deleted row) rebuilds the
+    index.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self) -> None:
+        self.players: Dict[int, PlayerStats] = {}
+        self.history: List[GameKey] = []
+
+    def update(self, games: List[GameKey]) -> None:
+        """Brings the index in line with exactly `games`."""
+        keys = sorted(games, key=lambda k: k[0])
+        done = len(self.history)
+        if keys[:done] != self.history:
+            self._reset()
+            done = 0
+
+        for key in keys[done:]:
+            self._add(key)
+        self.history = keys
+
+    def get(self, player: int) -> Optional[PlayerStats]:
+        return self.players.get(player)
+
+    def _add(self, key: GameKey) -> None:
+        date, team_one, score_one, team_two, score_two = key
+        total = score_one + score_two
+        margin = (score_one - score_two) / total if total else 0.0
+        for team, other, sign in [
+            (team_one, team_two, 1),
+            (team_two, team_one, -1),
+        ]:
+            for player in team:
+                stats = self.players.get(player)
+                if stats is None:
+                    stats = self.players[player] = PlayerStats(player)
+                stats.games += 1
+                stats.wins += int(sign * margin > 0)
+                stats.losses += int(sign * margin < 0)
+                stats.margin += sign * margin
+                stats.dates.append(date)
+                stats.teammates.update(p for p in team if p != player)
+                stats.opponents.update(other)
+
+
+# The index of each history (sheet ID) seen so far.
+INDEXES: Dict[str, StatsIndex] = {}
+
+
+def get_stats_index(history: str, games: List[GameKey]) -> StatsIndex:
+    """The up to date `StatsIndex` for the `history` sheet."""
+    index = INDEXES.setdefault(history, StatsIndex())
+    index.update(games)
+    return index
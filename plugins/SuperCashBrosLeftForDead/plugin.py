@@ -1,15 +1,22 @@
+import asyncio
 from plugins.SuperCashBrosLeftForDead.season import Season
 from discord import Colour, Embed, File
 from discord.ext.commands.context import Context
 from discord.ext.commands.core import command
+from typing import AsyncIterator, List, Optional, Tuple
 
 from models.lobby import Lobby
 from models.config import Config
-from .ranker import get_ranks, rank
+from .ranker import get_ranks, get_season_ranks, rank  # noqa F401
+from .ranker import ranked_page
 from .composite import draw_composite
-from .game_data import GameData
+from .game_data import GameData, GameHistory
+from .player_stats import get_stats_index
+from .synergy import get_synergy_index
+from utils.constraints import Constraints
 from utils.directive import directive, parse_multi
 from utils.usage_exception import UsageException
+from utils.verses import MatchMask, count_layouts, from_mask
 
 import plugins.SuperCashBrosLeftForDead.ranking_config as rc
 
@@ -37,6 +44,7 @@ def SuperCashBrosLeftForDead(config: Config, props: str):
             config.pLeft4Dead["history"] = history
             config.installCommand(ranked)
             config.installCommand(leaderboard)
+            config.installCommand(stats)
 
 
 @command()
@@ -45,39 +53,84 @@ async def ranked(lobby: "Lobby", ctx: Context):
     if not lobby.is_ready():
         raise UsageException.not_enough_for_match(lobby.channel)
 
-    if __name__ not in lobby._cache:
-        id = lobby.c.pLeft4Dead["history"]
-        matches = lobby.get_matches()
-        data = await GameData.fetch(id, lobby.channel)
-        inactive_rank = get_ranks(data, Season.all_time())
-        if rc.USE_ROLLING_SEASON:
-            season = Season(rc.LENGTH_DAYS, rc.PLACEMENT_GAMES)
-            active_rank = get_ranks(data, season)
-
-        def get_player_rank(p: int) -> int:
-            if active_rank and p in active_rank:
-                return active_rank[p]
-            if p in inactive_rank:
-                return inactive_rank[p]
-            return rc.AVERAGE_RANK
-
-        await rank(matches, get_player_rank)
-        lobby._cache[__name__] = iter(enumerate(matches))
-        lobby._cache[f"{__name__}-get_rank"] = get_player_rank
-
-    next_match = next(lobby._cache[__name__], None)
-    if next_match is None:
-        raise UsageException.seen_all_matches(lobby.channel)
-
-    i, teams = next_match
-    teams = list(teams)
-    team1, team2 = list(teams)[0], list(teams[1])
+    # The match generator waits on the worker pool between pages and
+    # can only be advanced by one command at a time.
+    lock = lobby._cache.setdefault(f"{__name__}-lock", asyncio.Lock())
+    async with lock:
+        if __name__ not in lobby._cache:
+            id = lobby.c.pLeft4Dead["history"]
+            players, _alternates = lobby.get_players()
+            data = await GameData.fetch(id, lobby.channel)
+            active_rank = None
+            if rc.USE_ROLLING_SEASON:
+                season = Season(rc.LENGTH_DAYS, rc.PLACEMENT_GAMES)
+                inactive_rank, active_rank = get_season_ranks(
+                    data, [Season.all_time(), season]
+                )
+            else:
+                inactive_rank = get_ranks(data, Season.all_time())
+
+            def get_player_rank(p: int) -> int:
+                if active_rank and p in active_rank:
+                    return active_rank[p]
+                if p in inactive_rank:
+                    return inactive_rank[p]
+                return rc.AVERAGE_RANK
+
+            ranks = [get_player_rank(p.member.id) for p in players]
+            constraints = lobby.get_constraints(players)
+            synergy = None
+            if rc.SYNERGY_WEIGHT:
+                if not isinstance(data, GameHistory):
+                    data = GameHistory(data)
+                index = get_synergy_index(id, data.keys())
+                ids = [p.member.id for p in players]
+                synergy = index.matrix(ids, rc.SYNERGY_WEIGHT)
+            lobby._cache[__name__] = _ranked_matches(
+                lobby, ranks, constraints, synergy
+            )
+            lobby._cache[f"{__name__}-get_rank"] = get_player_rank
+            lobby._cache[f"{__name__}-players"] = players
+
+        matches = lobby._cache[__name__]
+        players = lobby._cache[f"{__name__}-players"]
+        get_rank = lobby._cache[f"{__name__}-get_rank"]
+        try:
+            i, match = await matches.__anext__()
+        except StopAsyncIteration:
+            raise UsageException.seen_all_matches(lobby.channel)
+
+    teams = from_mask(match, players)
     channel = lobby.channel.id
-    get_rank = lobby._cache[f"{__name__}-get_rank"]
-    composite = await draw_composite(i, team1, team2, channel, get_rank)
+    composite = await draw_composite(i, teams, channel, get_rank)
     await ctx.send(file=File(composite))
 
 
+async def _ranked_matches(
+    lobby: Lobby,
+    ranks: List[float],
+    constraints: Constraints,
+    synergy: Optional[List[List[float]]] = None,
+) -> AsyncIterator[Tuple[int, MatchMask]]:
+    teams = lobby.c.vTeams
+    size = count_layouts(len(ranks), teams)
+    page, after = await lobby.run_matchmaking(
+        ranked_page, ranks, teams, None, constraints, synergy, size=size
+    )
+    shown = 0
+    while True:
+        for match in page:
+            yield shown, match
+            shown += 1
+
+        if after is None:
+            return
+
+        page, after = await lobby.run_matchmaking(
+            ranked_page, ranks, teams, after, constraints, synergy, size=size
+        )
+
+
 @command()
 async def leaderboard(lobby, ctx: Context, option: str = None):
     """See player ranks"""
@@ -126,3 +179,66 @@ async def leaderboard(lobby, ctx: Context, option: str = None):
         )
 
     await ctx.send(embed=embed)
+
+
+@command()
+async def stats(lobby, ctx: Context, player: str = None):
+    """See a player's game history"""
+    id = lobby.c.pLeft4Dead["history"]
+    games = await GameData.fetch(id, lobby.channel)
+    if not isinstance(games, GameHistory):
+        games = GameHistory(games)
+    index = get_stats_index(id, games.keys())
+
+    user_id = ctx.author.id if player is None else _find_player(lobby, player)
+    if user_id is None:
+        raise UsageException.unknown_player(lobby.channel, player)
+
+    def name(user_id: int) -> str:
+        return str(lobby.bot.get_user(user_id) or user_id)
+
+    embed = Embed(colour=Colour.blurple())
+    embed.title = f"Stats for {name(user_id)}"
+    player_stats = index.get(user_id)
+    if player_stats is None:
+        embed.description = "No games played yet."
+        await ctx.send(embed=embed)
+        return
+
+    s = player_stats
+    season = Season.current() if rc.USE_ROLLING_SEASON else Season.all_time()
+    record = f"{s.wins} won, {s.losses} lost, {s.ties} tied"
+    placed = s.season_games(season)
+    if s.is_placed(season):
+        standing = f"Ranked ({placed} games this season)"
+    else:
+        standing = f"Unranked ({placed}/{season.placements} placement games)"
+
+    def people(counts) -> str:
+        top = counts.most_common(3)
+        return ", ".join(f"{name(p)} ({n})" for p, n in top) or "None"
+
+    embed.add_field(name="Games", value=f"{s.games}: {record}", inline=False)
+    embed.add_field(
+        name="Average margin", value=f"{s.average_margin:+.1%}", inline=False
+    )
+    embed.add_field(
+        name="Last played", value=f"{s.last_played:%m/%d/%Y}", inline=False
+    )
+    embed.add_field(name="Season", value=standing, inline=False)
+    embed.add_field(name="Teammates", value=people(s.teammates), inline=False)
+    embed.add_field(name="Opponents", value=people(s.opponents), inline=False)
+    await ctx.send(embed=embed)
+
+
+def _find_player(lobby: Lobby, player: str) -> Optional[int]:
+    """A player's id from their name in the lobby, a mention or an id."""
+    for p in lobby.players:
+        if player.lower() in (
+            str(p.get_name()).lower(),
+            str(p.get_mention()).lower(),
+        ):
+            return p.member.id
+
+    digits = player.strip("<@!>")
+    return int(digits) if digits.isdigit() else None
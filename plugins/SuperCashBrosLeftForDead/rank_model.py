@@ -0,0 +1,296 @@
+from collections import Counter, OrderedDict
+from copy import deepcopy
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List
+from typing import Optional, Tuple
+
+from numpy import add, arange, array, concatenate, diag_indices_from
+from numpy import fromiter, full, int64, ix_, ndarray, outer, pad, repeat
+from numpy import unique, zeros
+from numpy.linalg import pinv
+
+from .game_data import Game, GameHistory, GameKey, game_key  # noqa F401
+from .season import Season
+
+import plugins.SuperCashBrosLeftForDead.ranking_config as rc
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
+# Every game has the same number of +1s and -1s for a full lobby, so
+# the player columns are usually linearly dependent and the centered
+# normal equations are singular. A ridge this small (relative to the
+# biggest diagonal entry) makes them positive definite. What's left of
+# rounding noise is mostly the same shift for every player, which
+# ranks don't see since they only compare players.
+RIDGE = 1e-12
+# The fallback pseudo-inverse cuts off singular values below this.
+RCOND = 1e-12
+
+
+class RankModel:
+    """
+    The weighted least squares behind `get_ranks`, kept as running
+    sums (the normal equations) rather than as a table of games.
+    Each game is a row with +1 for team one, -1 for team two and
+    the score difference as the target, weighted by its points and
+    its age (see `GAME_WEIGHT_HALFLIFE_DAYS`).
+
+    Games are added and removed in batches through a sparse design
+    matrix, so a change only touches the sums for the players in it.
+    When a newer game arrives every older game ages by the same
+    number of days, so their weights all shrink by the same factor
+    and the sums are rescaled instead of being rebuilt.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self) -> None:
+        self.games: Counter = Counter()
+        self.index: Dict[int, int] = {}
+        self.newest: Optional[datetime] = None
+        self.weight = 0.0  # sum of weights
+        self.target = 0.0  # weighted sum of targets
+        self.x = zeros(0)  # weighted sum of each player's column
+        self.xx = zeros((0, 0))  # weighted column products
+        self.xy = zeros(0)  # weighted column-target products
+        self.counts = zeros(0, dtype=int)  # games played per player
+
+    def update(self, games: List[GameKey]) -> None:
+        """Brings the model in line with exactly `games` (see `game_key`)."""
+        keys = Counter(games)
+        newest = max(key[0] for key in keys)
+        if self.newest is not None and newest != self.newest:
+            if not self._can_rescale(keys, newest):
+                self._reset()
+            else:
+                days = (newest - self.newest).days
+                self._scale(0.5 ** (days / rc.GAME_WEIGHT_HALFLIFE_DAYS))
+        self.newest = newest
+
+        changes = dict(keys - self.games)
+        changes.update({k: -t for k, t in (self.games - keys).items()})
+        self._add(changes)
+        self.games = keys
+
+    def players(self, placements: int) -> List[int]:
+        """Everyone with at least `placements` games (and at least one)."""
+        placements = max(1, placements)
+        return [
+            p for p, i in self.index.items() if self.counts[i] >= placements
+        ]
+
+    def solve(self, players: List[int]) -> ndarray:
+        """
+        The regression coefficient of each of `players`, fitted with
+        an intercept and ignoring every other player. This matches
+        `LinearRegression().fit(X, y, weights).coef_`: the columns
+        are centered by their weighted mean and the minimum norm
+        solution is taken when players can't be told apart.
+
+        The normal equations are solved with a Cholesky factorization,
+        with a tiny ridge (see `RIDGE`). A pseudo-inverse is only used
+        if the factorization fails.
+        """
+        from scipy.linalg import LinAlgError, cho_factor, cho_solve
+
+        columns = [self.index[p] for p in players]
+        mean_x = self.x[columns] / self.weight
+        mean_y = self.target / self.weight
+        xx = self.xx[ix_(columns, columns)]
+        xx = xx - self.weight * outer(mean_x, mean_x)
+        xy = self.xy[columns] - self.weight * mean_x * mean_y
+        if len(columns) == 0:
+            return zeros(0)
+
+        ridge = RIDGE * max(xx.diagonal().max(), 0.0)
+        xx[diag_indices_from(xx)] += ridge
+        try:
+            return cho_solve(cho_factor(xx), xy)
+        except LinAlgError:
+            xx[diag_indices_from(xx)] -= ridge
+            return pinv(xx, rcond=RCOND, hermitian=True) @ xy
+
+    def _can_rescale(self, keys: Counter, newest: datetime) -> bool:
+        # Ages are whole days, which only shift evenly when every game
+        # is at the same time of day (dates from the sheet are).
+        clock = newest.time()
+        return self.newest.time() == clock and all(
+            key[0].time() == clock for key in keys
+        )
+
+    def _scale(self, factor: float) -> None:
+        self.weight *= factor
+        self.target *= factor
+        self.x *= factor
+        self.xx *= factor
+        self.xy *= factor
+
+    def _add(self, changes: Dict[GameKey, int]) -> None:
+        """Adds each game as many times as given (negative removes)."""
+        if not changes:
+            return
+
+        from scipy.sparse import diags
+
+        X, targets, weights = self._design(changes)
+        self.weight += weights.sum()
+        self.target += weights @ targets
+        self.x += X.T @ weights
+        self.xy += X.T @ (weights * targets)
+        gram = (X.T @ diags(weights) @ X).tocoo()
+        add.at(self.xx, (gram.row, gram.col), gram.data)
+
+    def _design(
+        self, changes: Dict[GameKey, int]
+    ) -> Tuple["csr_matrix", ndarray, ndarray]:
+        """
+        The rows for `changes` as a sparse matrix with a column per
+        player (+1 on team one, -1 on team two), with the target and
+        weight of each row. Games played counts are updated too.
+        """
+        from scipy.sparse import csr_matrix
+
+        keys = list(changes)
+        times = fromiter(changes.values(), dtype=int64, count=len(keys))
+        one = array([key[2] for key in keys], dtype=float)
+        two = array([key[4] for key in keys], dtype=float)
+        ages = array([(self.newest - key[0]).days for key in keys])
+        decay = 0.5 ** (ages / rc.GAME_WEIGHT_HALFLIFE_DAYS)
+
+        # Every player on team one, then every player on team two.
+        sizes = [len(key[1]) for key in keys] + [len(key[3]) for key in keys]
+        players = [p for key in keys for p in key[1]]
+        players += [p for key in keys for p in key[3]]
+        rows = repeat(concatenate([arange(len(keys))] * 2), sizes)
+        columns = self._columns(players)
+        signs = full(len(players), -1.0)
+        signs[: sum(sizes[: len(keys)])] = 1.0
+        add.at(self.counts, columns, times[rows])
+
+        # A player listed twice in a game counts once, on team one
+        # first (see `Game.get_player_team_modifier`).
+        _, first = unique(rows * len(self.index) + columns, return_index=True)
+        X = csr_matrix(
+            (signs[first], (rows[first], columns[first])),
+            shape=(len(keys), len(self.index)),
+        )
+        return X, (one - two) / (one + two), times * decay * (one + two)
+
+    def _columns(self, players: List[int]) -> ndarray:
+        """Each player's column, adding columns for new players."""
+        start = len(self.index)
+        for player in players:
+            self.index.setdefault(player, len(self.index))
+
+        added = len(self.index) - start
+        if added:
+            self.x = pad(self.x, (0, added))
+            self.xx = pad(self.xx, ((0, added), (0, added)))
+            self.xy = pad(self.xy, (0, added))
+            self.counts = pad(self.counts, (0, added))
+
+        return fromiter(
+            (self.index[p] for p in players), dtype=int64, count=len(players)
+        )
+
+
+class RankCache:
+    """
+    Remembers the ranks computed for each season of each history.
+    Ranks are keyed by a fingerprint of the season's games and the
+    ranking settings, so asking again with unchanged data is a
+    lookup. When the games did change, the season's model (a
+    `RankModel` unless told otherwise) is updated with just the
+    difference instead of refitting.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._ranks: "OrderedDict[int, Dict[int, float]]" = OrderedDict()
+        self._models: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(
+        self,
+        all_games: List[Game],
+        season: Season,
+        solve: Callable[[Any, List[int]], Dict[int, float]],
+        model: Callable[[], Any] = RankModel,
+    ) -> Dict[int, float]:
+        """
+        The ranks for `season`. On a miss, `solve(model, players)`
+        turns the updated model into ranks. `model` makes a new, empty
+        model. Anything with the `update`, `players` and `solve`
+        methods of `RankModel` will do.
+        """
+        return self.get_many(all_games, [season], solve, model)[0]
+
+    def get_many(
+        self,
+        all_games: List[Game],
+        seasons: List[Season],
+        solve: Callable[[Any, List[int]], Dict[int, float]],
+        model: Callable[[], Any] = RankModel,
+    ) -> List[Dict[int, float]]:
+        """
+        The ranks for each of `seasons`, like `get`. The games are
+        read and sorted once for all of them (not at all if they're
+        already a `GameHistory`). Seasons are windows of recent games,
+        so a model for a longer season starts from the model of a
+        shorter one and only adds the older games.
+        """
+        if not isinstance(all_games, GameHistory):
+            all_games = GameHistory(all_games)
+        keys = all_games.keys()
+        today = datetime.now()
+        starts = [all_games.start(s.get_cutoff(today)) for s in seasons]
+        order = sorted(range(len(seasons)), key=lambda i: -starts[i])
+
+        results: List[Dict[int, float]] = [{}] * len(seasons)
+        previous = None
+        for i in order:
+            season = seasons[i]
+            start = starts[i]
+            window = keys[start:]
+            settings = (
+                season.days_ago,
+                season.placements,
+                rc.GAME_WEIGHT_HALFLIFE_DAYS,
+                rc.AVERAGE_RANK,
+                model,
+            )
+            fingerprint = hash((settings, tuple(window)))
+            if fingerprint in self._ranks:
+                self.hits += 1
+                self._ranks.move_to_end(fingerprint)
+                results[i] = dict(self._ranks[fingerprint])
+                continue
+
+            self.misses += 1
+            ranks: Dict[int, float] = {}
+            if window:
+                # The oldest game tells histories (sheets) apart.
+                history = (keys[0], settings)
+                fitted = self._models.pop(history, None)
+                if fitted is None:
+                    fitted = deepcopy(previous) if previous else model()
+                fitted.update(window)
+                self._models[history] = fitted
+                previous = fitted
+                ranks = solve(fitted, fitted.players(season.placements))
+
+            self._ranks[fingerprint] = ranks
+            results[i] = dict(ranks)
+
+        for cache in (self._ranks, self._models):
+            while len(cache) > self.max_entries:
+                cache.popitem(last=False)
+
+        return results
+
+    def clear(self) -> None:
+        self._ranks.clear()
+        self._models.clear()
@@ -1,39 +1,253 @@
 from plugins.SuperCashBrosLeftForDead.season import Season
-from typing import Callable, List, Dict, Set
-from numpy import matrix
-from sklearn.linear_model import LinearRegression
+from heapq import heappush, heapreplace
+from itertools import count, islice
+from typing import Callable, Iterable, Iterator, List, Dict, Optional
+from typing import Sequence, Tuple
+from numpy import arange, argsort, array, einsum, int64, ndarray, zeros
 from statistics import stdev, mean
 
-from utils.verses import Match
+from models.player import Player
+from utils.constraints import Constraints
+from utils.offload import check_cancelled
+from utils.verses import Match, MatchMask, count_layouts, get_template
+from utils.verses import iter_masks
 
 from .game_data import Game
+from .balancer import heuristic_matches
+from .objectives import imbalance
+from .online_model import OnlineRatings
+from .rank_model import RankCache, RankModel
+from .solver import best_matches
 
 import plugins.SuperCashBrosLeftForDead.ranking_config as rc
 
+# Row `b` holds the bits of the byte `b`, lowest bit first.
+BYTE_BITS = (arange(256)[:, None] >> arange(8)) & 1
 
-async def rank(matches: List[Match], get_player_rank: Callable):
-    def mean_balance(match: Match) -> float:
-        (team_one, team_two) = match
-        avg_one = mean([get_player_rank(p.member.id) for p in team_one])
-        avg_two = mean([get_player_rank(p.member.id) for p in team_two])
-        return abs(avg_one - avg_two)
+# Matches are scored this many at a time when paging through them.
+CHUNK_SIZE = 4096
 
-    matches.sort(key=mean_balance)
+RANKS = RankCache()
+# The models `RANK_BACKEND` can pick from.
+BACKENDS = {"regression": RankModel, "online": OnlineRatings}
 
 
-def get_ranks(all_games: List[Game], season: Season) -> Dict[int, float]:
-    players = season.get_players(all_games)
+async def rank(
+    matches: List[Match],
+    get_player_rank: Callable,
+    objective: Optional[str] = None,
+):
+    """
+    Sorts matches from most to least balanced. Each player's rank is
+    looked up once and all matches are scored together in NumPy.
+    """
+    index: Dict[Player, int] = {}
+    masks = []
+    for match in matches:
+        # Teams are ordered by size so that every row of the score
+        # matrix lines up, whatever order the frozenset iterates in.
+        teams = sorted(match, key=len)
+        for player in (p for team in teams for p in team):
+            index.setdefault(player, len(index))
+        masks.append(tuple(sum(1 << index[p] for p in t) for t in teams))
+
+    ranks = [get_player_rank(p.member.id) for p in index]
+    order = argsort(score_masks(masks, ranks, objective), kind="stable")
+    matches[:] = [matches[i] for i in order]
+
+
+async def rank_masks(
+    matches: List[MatchMask],
+    ranks: List[float],
+    objective: Optional[str] = None,
+):
+    """
+    Same ordering as `rank` but for compact matches. `ranks[i]` is
+    the rank of the player at index `i` of the match masks.
+    """
+    order = argsort(score_masks(matches, ranks, objective), kind="stable")
+    matches[:] = [matches[i] for i in order]
+
+
+def score_masks(
+    matches: Sequence[MatchMask],
+    ranks: Sequence[float],
+    objective: Optional[str] = None,
+    synergy: Optional[Sequence[Sequence[float]]] = None,
+) -> ndarray:
+    """
+    Scores every match in one pass. Team totals are built a byte of
+    the mask at a time: a 256 entry table holds the rank total of
+    every combination of those 8 players, so each byte is a single
+    array lookup for all matches at once. See `objectives` for what
+    each objective measures.
+
+    `synergy[i][j]` is added to the total of any team with both
+    players `i` and `j` (see `SynergyIndex.matrix`).
+    """
+    objective = objective or rc.BALANCE_OBJECTIVE
+    if not matches:
+        return zeros(0)
+
+    # Masks of more than 63 players don't fit in int64 and fall back
+    # to (slower) Python ints. Lobbies that big are rare.
+    masks = array(matches, dtype=int64 if len(ranks) < 64 else object)
+    ranks = array(ranks, dtype=float)
+    team_sums = zeros(masks.shape)
+    for offset in range(0, len(ranks), 8):
+        chunk = ranks[offset:][:8]
+        table = BYTE_BITS[:, : len(chunk)] @ chunk
+        team_sums += table[((masks >> offset) & 255).astype(int64)]
+
+    if synergy is not None:
+        bits = ((masks[..., None] >> arange(len(ranks))) & 1).astype(float)
+        pairs = einsum("mti,ij,mtj->mt", bits, array(synergy, float), bits)
+        team_sums += pairs / 2
+
+    sizes = array([bin(team).count("1") for team in matches[0]], float)
+    playing = sizes > 0
+    return imbalance(team_sums[:, playing], sizes[playing], objective)
+
+
+def ranked_matches(
+    ranks: Sequence[float],
+    teams: Optional[List[int]],
+    constraints: Optional[Constraints] = None,
+) -> Iterator[MatchMask]:
+    """
+    Matches for the `ranked` command, most balanced first. Small
+    lobbies are ranked exactly like `rank`, bigger ones are handed
+    to the solver rather than scoring every possible match. The
+    biggest lobbies use the `balancer` heuristics, unless they have
+    constraints (which only the solver handles).
+    """
+    page, after = ranked_page(ranks, teams, None, constraints)
+    yield from page
+    while after is not None:
+        page, after = ranked_page(ranks, teams, after, constraints)
+        yield from page
+
+
+def ranked_page(
+    ranks: Sequence[float],
+    teams: Optional[List[int]],
+    after: Optional[Tuple] = None,
+    constraints: Optional[Constraints] = None,
+    synergy: Optional[Sequence[Sequence[float]]] = None,
+) -> Tuple[List[MatchMask], Optional[Tuple]]:
+    """
+    One page of `ranked_matches` and the cursor for the page after it
+    (`None` once there are no more). This only takes plain data so
+    it can be run in a worker process.
+
+    `synergy` (see `score_masks`) is only used by lobbies small enough
+    to score every match. The solver and the balancer need team values
+    that are plain sums of ranks.
+    """
+    k = rc.RANKED_PAGE_SIZE
+    if count_layouts(len(ranks), teams) <= rc.ENUMERATION_LIMIT:
+        if constraints:
+            matches = iter_masks(len(ranks), teams, True, constraints)
+        else:
+            matches = get_template(len(ranks), teams)
+        page = _next_page(matches, ranks, k, after, None, synergy)
+    elif constraints or len(ranks) <= rc.EXACT_SEARCH_PLAYERS:
+        page = best_matches(ranks, teams, k, after, None, constraints)
+    else:
+        page = heuristic_matches(ranks, teams, k, after)
+
+    cursor = page[-1][0] if len(page) == k else None
+    return [mask for _, mask in page], cursor
+
+
+def top_matches(
+    matches: Callable[[], Iterable[MatchMask]],
+    ranks: Sequence[float],
+    page_size: Optional[int] = None,
+    objective: Optional[str] = None,
+) -> Iterator[MatchMask]:
+    """
+    Yields matches in exactly the order `rank_masks` would sort them,
+    without sorting them all. Only a page of the best matches is held
+    at a time, and the next page is only found once the previous one
+    has been used up. `matches` is called once per page and must
+    produce the same matches in the same order every time.
+    """
+    page_size = page_size or rc.RANKED_PAGE_SIZE
+    after = None
+    while True:
+        page = _next_page(matches(), ranks, page_size, after, objective)
+        for _key, mask in page:
+            yield mask
+        if len(page) < page_size:
+            return
+        after = page[-1][0]
+
+
+def _next_page(
+    matches: Iterable[MatchMask],
+    ranks: Sequence[float],
+    k: int,
+    after: Optional[Tuple[float, int]],
+    objective: Optional[str],
+    synergy: Optional[Sequence[Sequence[float]]] = None,
+) -> List[Tuple[Tuple[float, int], MatchMask]]:
+    """
+    The `k` best matches ordered by (score, position) that come after
+    `after`. The position breaks ties the same way a stable sort does.
+    """
+    heap: List[Tuple[float, int, MatchMask]] = []  # negated, worst first
+    matches = iter(matches)
+    offset = count(step=CHUNK_SIZE)
+    while chunk := list(islice(matches, CHUNK_SIZE)):
+        check_cancelled()
+        start = next(offset)
+        scores = score_masks(chunk, ranks, objective, synergy)
+        for i in argsort(scores, kind="stable"):
+            key = (scores[i], start + i)
+            if after is not None and key <= after:
+                continue
+            if len(heap) < k:
+                heappush(heap, (-key[0], -key[1], chunk[i]))
+            elif key < (-heap[0][0], -heap[0][1]):
+                heapreplace(heap, (-key[0], -key[1], chunk[i]))
+            else:
+                break  # the rest of this chunk scores even worse
+
+    page = [((-score, -i), mask) for score, i, mask in heap]
+    return sorted(page)
+
+
+def get_ranks(
+    all_games: List[Game], season: Season, backend: Optional[str] = None
+) -> Dict[int, float]:
+    """
+    Each player's rank for `season`, from how score differences
+    depend on who played on which team. `backend` (`RANK_BACKEND` by
+    default) picks a regression over the season or online ratings.
+    Results are cached (see `RankCache`), so only the first call for a
+    given set of games does any fitting.
+    """
+    return get_season_ranks(all_games, [season], backend)[0]
+
+
+def get_season_ranks(
+    all_games: List[Game], seasons: List[Season], backend: Optional[str] = None
+) -> List[Dict[int, float]]:
+    """
+    The ranks for each of `seasons`, like `get_ranks`, but the games
+    are only read once and the longer seasons build on the shorter
+    ones.
+    """
+    model = BACKENDS[backend or rc.RANK_BACKEND]
+    return RANKS.get_many(all_games, seasons, __get_player_scores, model)
+
+
+def __get_player_scores(model, players: List[int]) -> Dict[int, float]:
     if len(players) == 0:
         return dict()
 
-    games = season.get_games(all_games)
-    model = LinearRegression().fit(
-        __get_training_data(players, games),
-        __get_target_values(games),
-        __get_weights(games),
-    )
-
-    scores = model.coef_[0]
+    scores = model.solve(players)
     average = mean(scores)
     std_dev = stdev(scores)
 
@@ -48,34 +262,3 @@ def __normalize(score: float) -> int:
     score *= 1000
     score += rc.AVERAGE_RANK
     return int(score)
-
-
-def __get_training_data(players: Set[int], games: List[Game]) -> matrix:
-    game_rows = []
-    for game in games:
-        player_cols = []
-        for player in players:
-            player_cols.append(game.get_player_team_modifier(player))
-        game_rows.append(player_cols)
-
-    return matrix(game_rows)
-
-
-def __get_target_values(games: List[Game]) -> matrix:
-    return matrix([[g.get_percent_difference()] for g in games])
-
-
-def __get_weights(games: List[Game]) -> matrix:
-    decay_weights = __get_decay_weights(games)
-    game_points = [g.team_one.score + g.team_two.score for g in games]
-    return [
-        decay * points for decay, points in zip(decay_weights, game_points)
-    ]
-
-
-def __get_decay_weights(games: List[Game]) -> matrix:
-    newest = max([g.date for g in games])
-    return [
-        0.5 ** ((newest - g.date).days / rc.GAME_WEIGHT_HALFLIFE_DAYS)
-        for g in games
-    ]
@@ -12,5 +12,44 @@ PLACEMENT_GAMES: int = 3
 # weight of games before this value (days ago)
 GAME_WEIGHT_HALFLIFE_DAYS: int = 60
 
+# How ranks are worked out from the game history.
+#  - "regression": a weighted least squares fit over the season
+#  - "online": ratings updated one game at a time (faster to keep
+#    up to date, but the order of games matters)
+RANK_BACKEND: str = "regression"
+
 # If a player has no history in our data, use this score.
 AVERAGE_RANK: int = 2500
+
+# How ranked matchmaking measures how lopsided a match is.
+#  - "mean": the gap between the best and worst team average rank
+#  - "sum": the gap between the best and worst team total rank
+#  - "variance": the variance of the team average ranks
+BALANCE_OBJECTIVE: str = "mean"
+
+# Some teammates do better together than their ranks say. Each pair's
+# synergy (their extra score margin as teammates) is added to their
+# team's total rank in ranked matchmaking, in rank points per 100% of
+# margin. Set to 0 to ignore synergy.
+SYNERGY_WEIGHT: float = 10_000
+# Pairs with few games together have their synergy shrunk towards
+# zero, by games / (games + this).
+SYNERGY_PRIOR_GAMES: int = 5
+
+# Ranked matches are found a page at a time, this many per page.
+RANKED_PAGE_SIZE: int = 10
+# Lobbies with at most this many possible matches are ranked exactly
+# in the same order as `rank`. Bigger lobbies use the match solver.
+ENUMERATION_LIMIT: int = 100_000
+# Bigger lobbies with at most this many players are searched exactly
+# by the match solver. Past this they're balanced heuristically, which
+# is much faster but may miss the very best match.
+EXACT_SEARCH_PLAYERS: int = 16
+
+# A loaded game history is used for this many seconds before checking
+# whether the sheet changed. It's only downloaded again if it did.
+SHEETS_CACHE_SECONDS: float = 300
+# Give up on loading the game history sheet after this many seconds.
+SHEETS_TIMEOUT_SECONDS: float = 30
+# Sheets downloads that can run at once (one per sheet is plenty).
+SHEETS_WORKERS: int = 4
@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Set
-from plugins.SuperCashBrosLeftForDead.game_data import Game
+from typing import Dict, List, Optional, Set
+from plugins.SuperCashBrosLeftForDead.game_data import Game, GameHistory
 
 import plugins.SuperCashBrosLeftForDead.ranking_config as rc
 
@@ -19,6 +19,10 @@ class Season:
         self.placements = placements
 
     def get_players(self, games: List[Game]) -> Set[int]:
+        if isinstance(games, GameHistory):
+            counts = games.count_games(self.get_cutoff())
+            return set([p for p in counts if counts[p] >= self.placements])
+
         all: Dict[int, int] = dict()  # id => #games
         for g in self.get_games(games):
             for p in g.team_one.players + g.team_two.players:
@@ -27,6 +31,23 @@ class Season:
         return set([p for p in all if all[p] >= self.placements])
 
     def get_games(self, games: List[Game]) -> List[Game]:
+        if isinstance(games, GameHistory):
+            start = games.start(self.get_cutoff())
+            return games[start:]
+
         today = datetime.now()
         season_start = timedelta(days=self.days_ago)
         return [g for g in games if (today - g.date) < season_start]
+
+    def get_cutoff(
+        self, today: Optional[datetime] = None
+    ) -> Optional[datetime]:
+        """
+        Games on or before this date are too old for the season. None
+        when the season goes back further than dates can.
+        """
+        today = today or datetime.now()
+        try:
+            return today - timedelta(days=self.days_ago)
+        except OverflowError:
+            return None
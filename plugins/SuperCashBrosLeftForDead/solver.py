@@ -0,0 +1,204 @@
+from bisect import insort
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from utils.constraints import Constraints
+from utils.offload import check_cancelled
+from utils.verses import MatchMask, fill_team_sizes
+
+from .objectives import imbalance_bound, imbalance_of, team_values
+
+import plugins.SuperCashBrosLeftForDead.ranking_config as rc
+
+# A match's position in the search: its score, then the choices made
+# to reach it. Every match has a unique cursor, and matches with the
+# same score are ordered the way the search visits them.
+Cursor = Tuple[float, Tuple[int, ...]]
+
+
+def balanced_matches(
+    ranks: Sequence[float],
+    teams: Optional[List[int]],
+    page_size: Optional[int] = None,
+    objective: Optional[str] = None,
+    constraints: Optional[Constraints] = None,
+) -> Iterator[Tuple[float, MatchMask]]:
+    """
+    Streams matches from most to least balanced without enumerating
+    the whole match space. Matches are scored the same way as `rank`
+    (see `objectives`).
+
+    Results are found a page at a time with `best_matches`. Each page
+    picks up right after the last match of the previous page.
+    """
+    page_size = page_size or rc.RANKED_PAGE_SIZE
+    after = None
+    while True:
+        page = best_matches(
+            ranks, teams, page_size, after, objective, constraints
+        )
+        for cursor, mask in page:
+            yield cursor[0], mask
+        if len(page) < page_size:
+            return
+        after = page[-1][0]
+
+
+def best_matches(
+    ranks: Sequence[float],
+    teams: Optional[List[int]],
+    k: int,
+    after: Optional[Cursor] = None,
+    objective: Optional[str] = None,
+    constraints: Optional[Constraints] = None,
+) -> List[Tuple[Cursor, MatchMask]]:
+    """
+    The `k` most balanced matches that come after `after`.
+
+    This is a depth-first branch-and-bound. Players are placed from
+    highest to lowest rank, each onto the team with the lowest
+    average first so good matches are found early. Every partial
+    match gets a lower bound on the score it can still reach and is
+    dropped once that bound can't beat the k-th best match found.
+
+    `constraints` limit where each player may go. A party's seats are
+    held on a team as soon as its first member is placed there.
+    """
+    objective = objective or rc.BALANCE_OBJECTIVE
+    sizes = fill_team_sizes(len(ranks), teams)
+    order = sorted(range(len(ranks)), key=lambda i: ranks[i], reverse=True)
+    sorted_ranks = [ranks[i] for i in order]
+    prefix = [0.0]
+    for r in sorted_ranks:
+        prefix.append(prefix[-1] + r)
+
+    num_players = len(order)
+    num_teams = len(sizes)
+    scored = [t for t in range(num_teams) if sizes[t] > 0]
+    if not scored or k <= 0:
+        return []
+
+    # Players that do not fit on a team sit out. They are tracked as
+    # one extra "bench" team that is ignored by the objective.
+    capacity = [*sizes, num_players - sum(sizes)]
+    sums = [0.0] * (num_teams + 1)
+    counts = [0] * (num_teams + 1)
+    masks = [0] * (num_teams + 1)
+    reserved = [0] * (num_teams + 1)
+
+    rules = constraints or Constraints()
+    rivals = rules.rivals(num_players)
+    pinned_teams = set(rules.pinned.values())
+    party_of: List[Tuple[int, ...]] = [()] * num_players
+    pin_of: List[Optional[int]] = [None] * num_players
+    for party in rules.parties(num_players):
+        pins = {rules.pinned.get(p) for p in party}
+        pins.discard(None)
+        if len(pins) > 1 or any(not 0 <= t < num_teams for t in pins):
+            return []
+        for p in party:
+            party_of[p] = party
+            pin_of[p] = next(iter(pins), None)
+    team_of: List[Optional[int]] = [None] * num_players
+    path: List[int] = []
+    best: List[Tuple[Cursor, MatchMask]] = []
+
+    def score() -> float:
+        values = [team_values(sums[t], sizes[t], objective) for t in scored]
+        return imbalance_of(values, objective)
+
+    def bound(depth: int) -> float:
+        # The best case for each team is a range of final values,
+        # filled from the highest or lowest of the remaining ranks.
+        highest_low = -float("inf")
+        lowest_high = float("inf")
+        for t in scored:
+            left = sizes[t] - counts[t]
+            most = prefix[depth + left] - prefix[depth]
+            least = prefix[num_players] - prefix[num_players - left]
+            low = team_values(sums[t] + least, sizes[t], objective)
+            high = team_values(sums[t] + most, sizes[t], objective)
+            highest_low = max(highest_low, low)
+            lowest_high = min(lowest_high, high)
+        spread = max(0.0, highest_low - lowest_high)
+        return imbalance_bound(spread, len(scored), objective)
+
+    def keep(score: float) -> None:
+        cursor = (score, tuple(path))
+        if after is not None and cursor <= after:
+            return
+        if len(best) == k and cursor >= best[-1][0]:
+            return
+        insort(best, (cursor, tuple(masks[:num_teams])))
+        del best[k:]
+
+    def choices(player: int) -> List[int]:
+        party = party_of[player]
+        joined = [team_of[p] for p in party if team_of[p] is not None]
+        if joined:
+            # A seat is already held for this player.
+            t = joined[0]
+            if t < num_teams and masks[t] & rivals[player]:
+                return []
+            return [t]
+
+        seen_empty = set()
+        options = []
+        for t in range(num_teams + 1):
+            if capacity[t] - counts[t] - reserved[t] < len(party):
+                continue
+            if pin_of[player] is not None and t != pin_of[player]:
+                continue
+            if t < num_teams and masks[t] & rivals[player]:
+                continue
+
+            # Empty teams of the same size are interchangeable. Only
+            # fill the first one to avoid producing mirrored matches.
+            if t < num_teams and counts[t] == 0 and t not in pinned_teams:
+                if sizes[t] in seen_empty:
+                    continue
+                seen_empty.add(sizes[t])
+            options.append(t)
+
+        def average(t: int) -> float:
+            if t == num_teams:
+                return float("inf")
+            return sums[t] / counts[t] if counts[t] else 0.0
+
+        return sorted(options, key=average)
+
+    def place(depth: int) -> None:
+        check_cancelled()
+        if depth == num_players:
+            keep(score())
+            return
+
+        # Anything found from here on is visited later than the
+        # current k-th best, so it only wins with a strictly better
+        # score. Ties are pruned along with worse matches.
+        if len(best) == k and bound(depth) >= best[-1][0][0]:
+            return
+
+        player = order[depth]
+        rank = sorted_ranks[depth]
+        # The first member of a party holds seats for the rest, who
+        # then fill them.
+        party = party_of[player]
+        first = all(team_of[p] is None for p in party)
+        seats = len(party) - 1 if first else -1
+        for choice, t in enumerate(choices(player)):
+            sums[t] += rank
+            counts[t] += 1
+            masks[t] |= 1 << player
+            reserved[t] += seats
+            team_of[player] = t
+            path.append(choice)
+            place(depth + 1)
+            path.pop()
+            team_of[player] = None
+            reserved[t] -= seats
+            sums[t] -= rank
+            counts[t] -= 1
+            masks[t] ^= 1 << player
+
+    place(0)
+    return best
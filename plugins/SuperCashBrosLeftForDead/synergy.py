@@ -0,0 +1,95 @@
+from collections import Counter
+from itertools import combinations
+from typing import Dict, List, Tuple
+
+from .game_data import GameKey
+
+import plugins.SuperCashBrosLeftForDead.ranking_config as rc
+
+
+class SynergyIndex:
+    """
+    How much better pairs of teammates do together than apart, from a
+    game history. Only pairs that have played together are stored.
+
+    A pair's synergy is their average score margin as teammates minus
+    the average of their own margins over all their games. It's shrunk
+    towards zero for pairs with few games together (see
+    `SYNERGY_PRIOR_GAMES`).
+
+    Everything is kept as sums, so games are added and removed one at
+    a time when the history changes.
+    """
+
+    def __init__(self):
+        self.games: Counter = Counter()
+        # (games, summed margin) of each player, and of each pair of
+        # teammates (lowest id first).
+        self.players: Dict[int, List[float]] = {}
+        self.pairs: Dict[Tuple[int, int], List[float]] = {}
+
+    def update(self, games: List[GameKey]) -> None:
+        """Brings the index in line with exactly `games`."""
+        keys = Counter(games)
+        for key, times in (self.games - keys).items():
+            self._add(key, -times)
+        for key, times in (keys - self.games).items():
+            self._add(key, times)
+        self.games = keys
+
+    def synergy(self, a: int, b: int) -> float:
+        """The synergy of `a` and `b`, as a score margin."""
+        n, total = self.pairs.get((min(a, b), max(a, b)), (0, 0.0))
+        if n <= 0:
+            return 0.0
+
+        def average(p: int) -> float:
+            games, margin = self.players[p]
+            return margin / games
+
+        alone = (average(a) + average(b)) / 2
+        return (total / n - alone) * n / (n + rc.SYNERGY_PRIOR_GAMES)
+
+    def matrix(self, players: List[int], weight: float) -> List[List[float]]:
+        """
+        The synergy of every pair of `players` times `weight`, by
+        position in `players`. This is what `score_masks` takes.
+        """
+        size = len(players)
+        matrix = [[0.0] * size for _ in range(size)]
+        for i, j in combinations(range(size), 2):
+            value = weight * self.synergy(players[i], players[j])
+            matrix[i][j] = matrix[j][i] = value
+
+        return matrix
+
+    def _add(self, key: GameKey, times: int) -> None:
+        date, team_one, score_one, team_two, score_two = key
+        total = score_one + score_two
+        margin = (score_one - score_two) / total if total else 0.0
+        for team, sign in [(team_one, 1), (team_two, -1)]:
+            members = sorted(set(team))
+            for player in members:
+                self._count(self.players, player, times, sign * margin)
+            for pair in combinations(members, 2):
+                self._count(self.pairs, pair, times, sign * margin)
+
+    @staticmethod
+    def _count(sums: Dict, key, times: int, margin: float) -> None:
+        n, total = sums.get(key, (0, 0.0))
+        n += times
+        if n == 0:
+            sums.pop(key, None)
+        else:
+            sums[key] = [n, total + times * margin]
+
+
+# The index of each history (sheet ID) seen so far.
+INDEXES: Dict[str, SynergyIndex] = {}
+
+
+def get_synergy_index(history: str, games: List[GameKey]) -> SynergyIndex:
+    """The up to date `SynergyIndex` for the `history` sheet."""
+    index = INDEXES.setdefault(history, SynergyIndex())
+    index.update(games)
+    return index
@@ -0,0 +1,76 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class Constraints:
+    """
+    Rules every match has to follow, by player index (the same
+    indexes used by match masks and layouts):
+
+    - `together`: groups of players that must share a team (a party).
+    - `apart`: groups of players that must all be on different teams.
+    - `pinned`: player index to the team position they must play on.
+
+    Players that sit out are not on a team, so they never break an
+    `apart` rule. A party sits out as a whole or not at all.
+    """
+
+    def __init__(
+        self,
+        together: Iterable[Iterable[int]] = (),
+        apart: Iterable[Iterable[int]] = (),
+        pinned: Optional[Dict[int, int]] = None,
+    ):
+        self.together = [tuple(sorted(set(g))) for g in together]
+        self.together = [g for g in self.together if len(g) > 1]
+        self.apart = [tuple(sorted(set(g))) for g in apart]
+        self.apart = [g for g in self.apart if len(g) > 1]
+        self.pinned = dict(pinned or {})
+
+    def __bool__(self) -> bool:
+        return bool(self.together or self.apart or self.pinned)
+
+    def __repr__(self) -> str:
+        return (
+            f"Constraints(together={self.together}, apart={self.apart},"
+            f" pinned={self.pinned})"
+        )
+
+    def parties(self, num_players: int) -> List[Tuple[int, ...]]:
+        """
+        Splits players `0..num_players` into the units that are
+        placed together. Overlapping `together` groups are merged,
+        everyone else is a party of one. Parties are ordered by their
+        lowest player.
+        """
+        leader = list(range(num_players))
+
+        def find(p: int) -> int:
+            while leader[p] != p:
+                leader[p] = leader[leader[p]]
+                p = leader[p]
+            return p
+
+        for group in self.together:
+            group = [p for p in group if p < num_players]
+            for p in group[1:]:
+                leader[find(p)] = find(group[0])
+
+        parties: Dict[int, List[int]] = {}
+        for p in range(num_players):
+            parties.setdefault(find(p), []).append(p)
+
+        return [tuple(party) for party in parties.values()]
+
+    def rivals(self, num_players: int) -> List[int]:
+        """
+        A bitmask per player of everyone they must not share a team
+        with.
+        """
+        rivals = [0] * num_players
+        for group in self.apart:
+            group = [p for p in group if p < num_players]
+            everyone = sum(1 << p for p in group)
+            for p in group:
+                rivals[p] |= everyone & ~(1 << p)
+
+        return rivals
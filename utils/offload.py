@@ -0,0 +1,114 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import RawArray
+from typing import Any, Callable, List, Optional, Set
+
+# Jobs smaller than this (measured in matches) run inline. Sending
+# work to another process costs more than ranking a small lobby.
+INLINE_LIMIT = int(os.environ.get("MATCHMAKING_INLINE_LIMIT", 20_000))
+
+# Worker processes for matchmaking. Zero keeps everything inline.
+WORKERS = int(os.environ.get("MATCHMAKING_WORKERS", 2))
+
+# Jobs that can be cancelled while queued or running at once. Each
+# one gets a flag shared with the workers, which the job checks (see
+# `check_cancelled`). Jobs past this many can only be abandoned.
+CANCEL_SLOTS = 64
+
+_pool: Optional[ProcessPoolExecutor] = None
+_flags: Any = None  # RawArray of CANCEL_SLOTS bytes, 1 when cancelled
+_free: List[int] = []  # flags not in use by a job
+_slot: Optional[int] = None  # in a worker, the running job's flag
+
+
+class Cancelled(Exception):
+    """Raised in a worker by a job that was cancelled."""
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool, _flags, _free
+    if _pool is None:
+        _flags = RawArray("b", CANCEL_SLOTS)
+        _free = list(range(CANCEL_SLOTS))
+        _pool = ProcessPoolExecutor(
+            max_workers=WORKERS, initializer=_start_worker, initargs=(_flags,)
+        )
+    return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        for slot in range(CANCEL_SLOTS):
+            _flags[slot] = 1
+        _pool.shutdown(wait=False)
+        _pool = None
+
+
+def check_cancelled() -> None:
+    """
+    Raises `Cancelled` if the job this worker is running was
+    cancelled. Long searches call this now and then so a cancelled job
+    frees its worker instead of running to the end. Does nothing for
+    jobs run inline.
+    """
+    if _slot is not None and _flags[_slot]:
+        raise Cancelled()
+
+
+def _start_worker(flags: Any) -> None:
+    global _flags
+    _flags = flags
+
+
+def _run(slot: Optional[int], fn: Callable, *args) -> Any:
+    global _slot
+    _slot = slot
+    try:
+        return fn(*args)
+    finally:
+        _slot = None
+
+
+async def offload(
+    fn: Callable,
+    *args,
+    size: int,
+    jobs: Optional[Set[asyncio.Future]] = None,
+) -> Any:
+    """
+    Matchmaking is pure CPU work. Running it on the event loop stalls
+    the websocket heartbeat and every other channel's commands, so
+    bigger jobs are sent to a process pool and awaited instead.
+
+    `fn` and `args` must be picklable: plain functions of player ids,
+    ranks and team sizes. While a job runs it is kept in `jobs` so
+    the owner can cancel it, e.g. when the lobby changes. Cancelled
+    jobs raise `asyncio.CancelledError` to the caller. A queued job is
+    dropped, and a running one stops at its next `check_cancelled`.
+    """
+    if size < INLINE_LIMIT or WORKERS < 1:
+        return fn(*args)
+
+    pool, flags, free = get_pool(), _flags, _free
+    slot = free.pop() if free else None
+    if slot is not None:
+        flags[slot] = 0
+    future = pool.submit(_run, slot, fn, *args)
+    if slot is not None:
+        # Only reused once the worker is done with it.
+        future.add_done_callback(lambda _: free.append(slot))
+
+    job = asyncio.wrap_future(future)
+    if jobs is not None:
+        jobs.add(job)
+    try:
+        return await job
+    except asyncio.CancelledError:
+        if slot is not None:
+            flags[slot] = 1
+        raise
+    finally:
+        if jobs is not None:
+            jobs.discard(job)
@@ -0,0 +1,54 @@
+from random import getrandbits
+from typing import Iterator, Optional
+
+MASK_64 = (1 << 64) - 1
+ROUNDS = 4
+
+
+def _mix(value: int) -> int:
+    """splitmix64 finalizer: a cheap, well-distributed integer hash"""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return value ^ (value >> 31)
+
+
+class Permutation:
+    """
+    Permutation is a seeded, random-access shuffle of `range(size)`.
+    Nothing is materialized: the only state is the seed, so it costs
+    the same to shuffle ten items as it does to shuffle ten million.
+
+    Internally this is a small Feistel network over the smallest
+    even number of bits that can hold `size`. Feistel networks are
+    always bijections, and "cycle walking" (re-encrypting values that
+    land outside of the range) keeps the output within `size`.
+    """
+
+    def __init__(self, size: int, seed: Optional[int] = None):
+        self.size = size
+        self.seed = getrandbits(64) if seed is None else seed
+
+        bits = max(2, (size - 1).bit_length())
+        bits += bits % 2
+        self._half = bits // 2
+        self._mask = (1 << self._half) - 1
+        self._keys = [_mix(self.seed + r) for r in range(ROUNDS)]
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.size:
+            raise IndexError("permutation index out of range")
+
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def __iter__(self) -> Iterator[int]:
+        for index in range(self.size):
+            yield self[index]
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self._half, value & self._mask
+        for key in self._keys:
+            left, right = right, left ^ (_mix(right ^ key) & self._mask)
+        return (left << self._half) | right
@@ -82,6 +82,13 @@ class UsageException(Exception):
             channel, "You've already seen all possible matches"
         )
 
+    @staticmethod
+    def lobby_changed(channel: TextChannel):
+        return UsageException(
+            channel,
+            "The lobby changed while I was finding matches. Try again.",
+        )
+
     @staticmethod
     def lobby_already_started(channel: TextChannel):
         return UsageException(
@@ -104,6 +111,12 @@ class UsageException(Exception):
             "The following sheet could not be loaded or parsed." f"\n{url}",
         )
 
+    @staticmethod
+    def unknown_player(channel: TextChannel, player: str):
+        return UsageException(
+            channel, f"No player called {player} could be found."
+        )
+
     @staticmethod
     def unexpected_option(
         channel: TextChannel,
@@ -1,12 +1,35 @@
+from collections import OrderedDict
 from functools import reduce
 from itertools import combinations
-from typing import FrozenSet, Optional, List, Set, Tuple, TypeVar
+from math import comb
+from operator import or_
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    Optional,
+    List,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 from models.player import Player
+from utils.constraints import Constraints
 
 Team = FrozenSet[Player]
 Match = FrozenSet[Team]
 
+# A match expressed as player indexes, one tuple per team.
+# Team order follows the requested team sizes.
+Layout = Tuple[Tuple[int, ...], ...]
+
+# The compact form of a layout. Each team is a bitmask where bit `i`
+# is set when player `i` is on the team. Prefer this when holding on
+# to many matches: two ints are far smaller than nested frozensets.
+MatchMask = Tuple[int, ...]
+
 T = TypeVar("T")
 
 
@@ -43,6 +66,458 @@ def _distribute_team_size(num_players: int, teams: List[int]) -> List[int]:
     return new_teams
 
 
+def fill_team_sizes(
+    num_players: int,
+    teams: Optional[List[int]],
+    distribute_evenly: bool = True,
+) -> List[int]:
+    """
+    Resolves the number of players each team will actually receive.
+    This mirrors `Verses`: teams are filled in order and the last
+    team(s) take whatever is left over when we run out of players.
+    """
+    teams = teams or []
+    if distribute_evenly:
+        teams = _distribute_team_size(num_players, teams)
+
+    sizes = []
+    for size in teams:
+        size = min(size, num_players)
+        sizes.append(size)
+        num_players -= size
+
+    return sizes
+
+
+def _group_team_sizes(sizes: List[int]) -> List[Tuple[int, List[int]]]:
+    """
+    Groups team positions by size, e.g. `[4, 1, 4]` becomes
+    `[(4, [0, 2]), (1, [1])]`. Teams of the same size are
+    interchangeable, so each group is filled as a whole.
+    """
+    groups: Dict[int, List[int]] = {}
+    for position, size in enumerate(sizes):
+        if size > 0:
+            groups.setdefault(size, []).append(position)
+
+    return list(groups.items())
+
+
+def _iter_blocks(chosen: Tuple[int, ...], size: int) -> Iterator[Layout]:
+    """
+    Splits `chosen` into unordered blocks of `size` players. The
+    lowest remaining player always starts the next block, so each
+    split is produced exactly once.
+    """
+    if not chosen:
+        yield ()
+        return
+
+    first, rest = chosen[0], chosen[1:]
+    for mates in combinations(rest, size - 1):
+        remaining = tuple(p for p in rest if p not in mates)
+        for blocks in _iter_blocks(remaining, size):
+            yield ((first, *mates), *blocks)
+
+
+def iter_layouts(
+    num_players: int,
+    teams: Optional[List[int]],
+    distribute_evenly: bool = True,
+    constraints: Optional[Constraints] = None,
+) -> Iterator[Layout]:
+    """
+    Lazily produces every unique match for `num_players` players as
+    player indexes. Unlike `Verses`, mirrored matches (the same teams
+    in a different order) are never generated, so there is nothing
+    to deduplicate afterwards.
+
+    Only matches that follow `constraints` are produced, if given.
+    """
+    if constraints:
+        yield from _iter_constrained_layouts(
+            num_players, teams, distribute_evenly, constraints
+        )
+        return
+
+    sizes = fill_team_sizes(num_players, teams, distribute_evenly)
+    groups = _group_team_sizes(sizes)
+    if not groups:
+        return
+
+    layout: List[Tuple[int, ...]] = [() for _ in sizes]
+
+    def place(group: int, pool: Tuple[int, ...]) -> Iterator[Layout]:
+        if group == len(groups):
+            yield tuple(layout)
+            return
+
+        size, positions = groups[group]
+        for chosen in combinations(pool, size * len(positions)):
+            taken = set(chosen)
+            rest = tuple(p for p in pool if p not in taken)
+            for blocks in _iter_blocks(chosen, size):
+                for position, block in zip(positions, blocks):
+                    layout[position] = block
+                yield from place(group + 1, rest)
+
+    yield from place(0, tuple(range(num_players)))
+
+
+def _iter_constrained_layouts(
+    num_players: int,
+    teams: Optional[List[int]],
+    distribute_evenly: bool,
+    constraints: Constraints,
+) -> Iterator[Layout]:
+    """
+    Places whole parties instead of single players, so every party
+    collapses to one step of the search. A party is never put where
+    it would break a rule, which prunes the whole branch rather than
+    building those matches and filtering them afterwards.
+    """
+    sizes = fill_team_sizes(num_players, teams, distribute_evenly)
+    if not any(sizes):
+        return
+
+    # Players that don't fit on a team sit on an extra "bench" team.
+    bench = len(sizes)
+    free = [*sizes, num_players - sum(sizes)]
+    rivals = constraints.rivals(num_players)
+    units = []
+    for party in constraints.parties(num_players):
+        members = sum(1 << p for p in party)
+        foes = reduce(or_, (rivals[p] for p in party), 0)
+        pins = {constraints.pinned.get(p) for p in party}
+        pins.discard(None)
+        if len(pins) > 1:
+            return  # the party is pinned to two different teams
+
+        pin = pins.pop() if pins else None
+        if pin is not None and not 0 <= pin < bench:
+            return
+        units.append((party, members, foes, pin))
+
+    # Pinned parties go first so that, by the time the rest are
+    # placed, the only empty teams are interchangeable ones. Then the
+    # biggest parties, since they have the fewest places to go.
+    units.sort(key=lambda u: (u[3] is None, -len(u[0]), u[0]))
+    masks = [0] * (bench + 1)
+
+    def options(unit: Tuple[Tuple[int, ...], int, int, Optional[int]]):
+        party, members, foes, pin = unit
+        if pin is not None:
+            fits = (
+                free[pin] >= len(party) and not (masks[pin] | members) & foes
+            )
+            return [pin] if fits else []
+
+        seen_empty = set()
+        choices = []
+        for t in range(bench):
+            if free[t] < len(party) or (masks[t] | members) & foes:
+                continue
+
+            # Empty teams of the same size would only give mirrored
+            # matches, so only the first one is tried.
+            if not masks[t]:
+                if sizes[t] in seen_empty:
+                    continue
+                seen_empty.add(sizes[t])
+            choices.append(t)
+
+        if free[bench] >= len(party):
+            choices.append(bench)
+        return choices
+
+    def place(unit: int) -> Iterator[Layout]:
+        if unit == len(units):
+            yield tuple(tuple(mask_indexes(m)) for m in masks[:bench])
+            return
+
+        party, members, _foes, _pin = units[unit]
+        for t in options(units[unit]):
+            free[t] -= len(party)
+            masks[t] |= members
+            yield from place(unit + 1)
+            free[t] += len(party)
+            masks[t] ^= members
+
+    yield from place(0)
+
+
+def _count_blocks(num_chosen: int, size: int) -> int:
+    count = 1
+    while num_chosen > 0:
+        count *= comb(num_chosen - 1, size - 1)
+        num_chosen -= size
+
+    return count
+
+
+def count_layouts(
+    num_players: int,
+    teams: Optional[List[int]],
+    distribute_evenly: bool = True,
+) -> int:
+    """
+    The number of matches `iter_layouts` would produce, computed
+    without enumerating them.
+    """
+    sizes = fill_team_sizes(num_players, teams, distribute_evenly)
+    groups = _group_team_sizes(sizes)
+    if not groups:
+        return 0
+
+    count = 1
+    for size, positions in groups:
+        num_chosen = size * len(positions)
+        count *= comb(num_players, num_chosen)
+        count *= _count_blocks(num_chosen, size)
+        num_players -= num_chosen
+
+    return count
+
+
+def _unrank_combination(
+    index: int, pool: Tuple[int, ...], k: int
+) -> Tuple[int, ...]:
+    """
+    Finds the `index`-th entry of `combinations(pool, k)` using the
+    combinatorial number system instead of iterating up to it.
+    """
+    chosen = []
+    start = 0
+    while k > 0:
+        for i in range(start, len(pool)):
+            count = comb(len(pool) - i - 1, k - 1)
+            if index < count:
+                chosen.append(pool[i])
+                start = i + 1
+                k -= 1
+                break
+            index -= count
+
+    return tuple(chosen)
+
+
+def unrank_layout(
+    index: int,
+    num_players: int,
+    teams: Optional[List[int]],
+    distribute_evenly: bool = True,
+) -> Layout:
+    """
+    Random access into `iter_layouts`. This is equivalent to
+    `list(iter_layouts(...))[index]` but runs in time proportional
+    to the number of players rather than the number of matches.
+    """
+    remaining = count_layouts(num_players, teams, distribute_evenly)
+    if not 0 <= index < remaining:
+        raise IndexError("match index out of range")
+
+    sizes = fill_team_sizes(num_players, teams, distribute_evenly)
+    layout: List[Tuple[int, ...]] = [() for _ in sizes]
+    pool = tuple(range(num_players))
+    for size, positions in _group_team_sizes(sizes):
+        num_chosen = size * len(positions)
+        remaining //= comb(len(pool), num_chosen)
+        digit, index = divmod(index, remaining)
+        chosen = _unrank_combination(digit, pool, num_chosen)
+        taken = set(chosen)
+        pool = tuple(p for p in pool if p not in taken)
+
+        for position in positions:
+            first, rest = chosen[0], chosen[1:]
+            remaining //= comb(len(rest), size - 1)
+            digit, index = divmod(index, remaining)
+            mates = _unrank_combination(digit, rest, size - 1)
+            layout[position] = (first, *mates)
+            chosen = tuple(p for p in rest if p not in mates)
+
+    return tuple(layout)
+
+
+def to_match(layout: Layout, players: List[Player]) -> Match:
+    return frozenset(
+        frozenset(players[i] for i in team) for team in layout if team
+    )
+
+
+def to_mask(layout: Layout) -> MatchMask:
+    return tuple(sum(1 << i for i in team) for team in layout)
+
+
+def mask_indexes(team: int) -> List[int]:
+    """The player indexes set in a team bitmask, lowest first."""
+    indexes = []
+    while team:
+        low = team & -team
+        indexes.append(low.bit_length() - 1)
+        team ^= low
+
+    return indexes
+
+
+def from_mask(mask: MatchMask, players: List[Player]) -> List[List[Player]]:
+    """
+    Expands a compact match back into teams of players. Team order
+    is preserved and empty teams are kept so positions line up with
+    the requested team sizes.
+    """
+    return [[players[i] for i in mask_indexes(team)] for team in mask]
+
+
+def iter_masks(
+    num_players: int,
+    teams: Optional[List[int]],
+    distribute_evenly: bool = True,
+    constraints: Optional[Constraints] = None,
+) -> Iterator[MatchMask]:
+    layouts = iter_layouts(num_players, teams, distribute_evenly, constraints)
+    for layout in layouts:
+        yield to_mask(layout)
+
+
+Shape = Tuple[int, Tuple[int, ...], bool]
+
+
+def _iter_masks_with(player: int, sizes: List[int]) -> Iterator[MatchMask]:
+    """
+    Every match of players `0..player` that puts `player` on a team.
+    `sizes` must be exact, i.e. there are enough players to fill them.
+    """
+    others = list(range(player))
+    seen = set()
+    for position, size in enumerate(sizes):
+        # Putting the player on either of two same sized teams would
+        # only produce mirrored matches.
+        if size == 0 or size in seen:
+            continue
+        seen.add(size)
+
+        rest = [s for i, s in enumerate(sizes) if i != position]
+        for mates in combinations(others, size - 1):
+            team = sum(1 << p for p in mates) | 1 << player
+            pool = [p for p in others if p not in mates]
+            layouts = iter_layouts(len(pool), rest, False)
+            if not any(rest):
+                layouts = iter([tuple(() for _ in rest)])
+            for layout in layouts:
+                masks = [sum(1 << pool[i] for i in t) for t in layout]
+                masks.insert(position, team)
+                yield tuple(masks)
+
+
+class TemplateCache:
+    """
+    The matches for a lobby depend only on its shape: the number of
+    ready players and the team sizes. This is a process-wide LRU of
+    match masks keyed by that shape so that lobbies with the same
+    setup (e.g. every 8 player `[4, 4]` lobby) share a single copy.
+
+    Shapes with more than `max_matches` matches are not retained;
+    holding on to them would cost more memory than they save time.
+    Those are streamed lazily instead.
+    """
+
+    def __init__(self, max_shapes: int = 32, max_matches: int = 100_000):
+        self.max_shapes = max_shapes
+        self.max_matches = max_matches
+        self.hits = 0
+        self.misses = 0
+        self._templates: "OrderedDict[Shape, Tuple[MatchMask, ...]]"
+        self._templates = OrderedDict()
+
+    def get(
+        self,
+        num_players: int,
+        teams: Optional[List[int]],
+        distribute_evenly: bool = True,
+    ) -> Iterable[MatchMask]:
+        shape = (num_players, tuple(teams or ()), distribute_evenly)
+        if shape in self._templates:
+            self.hits += 1
+            self._templates.move_to_end(shape)
+            return self._templates[shape]
+
+        self.misses += 1
+        count = count_layouts(num_players, teams, distribute_evenly)
+        if count > self.max_matches:
+            return iter_masks(num_players, teams, distribute_evenly)
+
+        template = self._derive(shape)
+        if template is None:
+            template = tuple(iter_masks(*shape))
+        self._templates[shape] = template
+        while len(self._templates) > self.max_shapes:
+            self._templates.popitem(last=False)
+
+        return template
+
+    def clear(self) -> None:
+        self._templates.clear()
+
+    def _derive(self, shape: Shape) -> Optional[Tuple[MatchMask, ...]]:
+        """
+        Lobbies usually change one ready player at a time, so the
+        shape next door is often cached already. Once there are
+        enough players to fill every team, the team sizes stop
+        changing and we can build on the neighbour instead:
+
+        - One more player: the old matches still apply (the new
+          player sits out) plus the matches that include them.
+        - One less player: the neighbour's matches that don't
+          include its last player.
+        """
+        num_players, teams, distribute_evenly = shape
+        needed = sum(teams)
+
+        smaller = (num_players - 1, teams, distribute_evenly)
+        if num_players - 1 >= needed and smaller in self._templates:
+            sizes = fill_team_sizes(num_players, list(teams))
+            added = _iter_masks_with(num_players - 1, sizes)
+            return self._templates[smaller] + tuple(added)
+
+        larger = (num_players + 1, teams, distribute_evenly)
+        if num_players >= needed and larger in self._templates:
+            last = 1 << num_players
+            return tuple(
+                match
+                for match in self._templates[larger]
+                if not any(team & last for team in match)
+            )
+
+        return None
+
+
+TEMPLATES = TemplateCache()
+
+
+def get_template(
+    num_players: int,
+    teams: Optional[List[int]],
+    distribute_evenly: bool = True,
+) -> Iterable[MatchMask]:
+    return TEMPLATES.get(num_players, teams, distribute_evenly)
+
+
+def iter_matches(
+    players: List[Player],
+    teams: Optional[List[int]],
+    distribute_evenly: bool = True,
+    constraints: Optional[Constraints] = None,
+) -> Iterator[Match]:
+    """
+    The lazy equivalent of `Verses`. Matches are yielded one at a
+    time and each unique match is yielded exactly once.
+    """
+    num_players = len(players)
+    layouts = iter_layouts(num_players, teams, distribute_evenly, constraints)
+    for layout in layouts:
+        yield to_match(layout, players)
+
+
 class Verses:
     """
     Verses is a short-lived path-finder that starts with a
@@ -59,7 +534,8 @@ class Verses:
 
     Sets are used to implicitly remove duplicates. There is
     wasted work in doing this, but it solves the match finding
-    problem generally, and it is easier to read.
+    problem generally, and it is easier to read. Prefer
+    `iter_matches` when performance matters.
     """
 
     def __init__(